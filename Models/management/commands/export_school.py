@@ -0,0 +1,31 @@
+import sys
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+import schedule_export
+
+
+class Command(BaseCommand):
+    help = (
+        "Streams every class's week schedule or pupil roster as CSV, or "
+        "both as JSON, to stdout or a file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("export", choices=list(schedule_export.EXPORTS))
+        parser.add_argument(
+            "-o", "--output", help="File to write, stdout by default"
+        )
+
+    def handle(self, *args, **options):
+
+        if options["output"]:
+            with open(options["output"], "wb") as output:
+                asyncio.run(self.write(options["export"], output))
+        else:
+            asyncio.run(self.write(options["export"], sys.stdout.buffer))
+
+    async def write(self, export: str, output):
+        async for chunk in schedule_export.EXPORTS[export]():
+            output.write(chunk)
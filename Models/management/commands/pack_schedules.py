@@ -0,0 +1,75 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+import repository
+from Models.models import ScheduleDays, Lessons
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves the lessons of every day from Lessons rows into "
+        "ScheduleDays.LessonNames, or back with --unpack. Run it after "
+        "switching PACKED_SCHEDULES; the bot reads both forms meanwhile."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--unpack", action="store_true")
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="Days per transaction"
+        )
+
+    def handle(self, *args, **options):
+
+        if options["unpack"]:
+            days = ScheduleDays.objects.filter(LessonNames__isnull=False)
+            convert = self.unpack
+        else:
+            days = ScheduleDays.objects.filter(LessonNames__isnull=True)
+            convert = self.pack
+
+        # Listed up front, SQLite can't update a table while reading it
+        pks = iter(list(days.values_list("pk", flat=True)))
+        total = 0
+
+        while batch := list(islice(pks, options["batch_size"])):
+            with transaction.atomic():
+                convert(batch)
+            total += len(batch)
+
+        self.stdout.write(f"{total} days converted")
+
+    def pack(self, pks: list[int]):
+
+        lessons = {pk: [] for pk in pks}
+
+        for ScheduleDay_id, order, name in (
+            Lessons.objects.filter(ScheduleDay_id__in=pks)
+            .order_by("Order")
+            .values_list("ScheduleDay_id", "Order", "SubjectName")
+        ):
+            lessons[ScheduleDay_id].append((order, name))
+
+        ScheduleDays.objects.bulk_update(
+            [
+                ScheduleDays(
+                    pk=pk, LessonNames=repository.names_by_order(day_lessons)
+                )
+                for pk, day_lessons in lessons.items()
+            ],
+            ["LessonNames"],
+        )
+        Lessons.objects.filter(ScheduleDay_id__in=pks).delete()
+
+    def unpack(self, pks: list[int]):
+
+        Lessons.objects.bulk_create(
+            Lessons(ScheduleDay_id=pk, Order=order, SubjectName=name)
+            for pk, names in ScheduleDays.objects.filter(
+                pk__in=pks
+            ).values_list("pk", "LessonNames")
+            for order, name in enumerate(names, start=1)
+            if name
+        )
+        ScheduleDays.objects.filter(pk__in=pks).update(LessonNames=None)
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Models', '0004_scheduledays_lessons'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notifications',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('IdempotencyKey', models.CharField(max_length=64, unique=True)),
+                ('Batch', models.CharField(max_length=32)),
+                ('TelegramId', models.BigIntegerField()),
+                ('Text', models.TextField()),
+                ('ParseMode', models.CharField(max_length=16, null=True)),
+                ('ReportTo', models.BigIntegerField(null=True)),
+                ('Status', models.CharField(choices=[('pending', 'В очереди'), ('sending', 'Отправляется'), ('sent', 'Доставлено'), ('failed', 'Не доставлено')], default='pending', max_length=7)),
+                ('CreatedAt', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['Status', 'id'], name='Models_noti_Status_153cfd_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:14
+
+import Models.models
+from django.db import migrations, models
+
+
+def remove_duplicates(apps, schema_editor):
+    """
+    Handlers always used .first() on these lookups, so the rows with the
+    lowest pk are the ones that were actually in use. Pupils of a duplicate
+    class are moved to the kept one before the duplicate is deleted.
+    """
+
+    Users = apps.get_model('Models', 'Users')
+    ClassRooms = apps.get_model('Models', 'ClassRooms')
+
+    kept = {}
+    for ClassRoom in ClassRooms.objects.order_by('pk'):
+        key = (ClassRoom.Number, ClassRoom.Letter)
+        if key in kept:
+            Users.objects.filter(ClassRoom=ClassRoom).update(ClassRoom=kept[key])
+            ClassRoom.delete()
+        else:
+            kept[key] = ClassRoom
+
+    seen = set()
+    for User in Users.objects.order_by('pk'):
+        if User.TelegramId in seen:
+            User.delete()
+        else:
+            seen.add(User.TelegramId)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Models', '0005_notifications'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='classrooms',
+            name='ClassRoomIdentifier',
+            field=models.CharField(default=Models.models.ClassRooms.generate_identifier, max_length=32, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='users',
+            name='TelegramId',
+            field=models.BigIntegerField(unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='lessons',
+            index=models.Index(fields=['ScheduleDay', 'Order'], name='Models_less_Schedul_74af0d_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='classrooms',
+            constraint=models.UniqueConstraint(fields=('Number', 'Letter'), name='unique_classroom_name'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Models', '0006_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='classrooms',
+            name='InviteQRFileId',
+            field=models.CharField(max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Models', '0007_classrooms_inviteqrfileid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FSMStates',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Key', models.CharField(max_length=255, unique=True)),
+                ('State', models.CharField(max_length=255, null=True)),
+                ('Data', models.JSONField(default=dict)),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:03
+
+import Models.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Models', '0008_fsmstates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scheduledays',
+            name='LessonNames',
+            field=models.JSONField(blank=True, encoder=Models.models.UnicodeJSONEncoder, null=True),
+        ),
+    ]
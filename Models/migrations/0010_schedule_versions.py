@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:04
+
+import Models.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Models', '0009_scheduledays_lessonnames'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scheduledays',
+            name='ContentHash',
+            field=models.CharField(blank=True, default='', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='scheduledays',
+            name='Version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='ScheduleDayVersions',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Version', models.PositiveIntegerField()),
+                ('LessonNames', models.JSONField(encoder=Models.models.UnicodeJSONEncoder)),
+                ('ContentHash', models.CharField(max_length=16)),
+                ('ChangedBy', models.BigIntegerField(null=True)),
+                ('CreatedAt', models.DateTimeField(auto_now_add=True)),
+                ('ScheduleDay', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='Versions', to='Models.scheduledays')),
+            ],
+            options={
+                'ordering': ['Version'],
+                'constraints': [models.UniqueConstraint(fields=('ScheduleDay', 'Version'), name='unique_schedule_day_version')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:23
+
+from django.db import migrations, models
+
+
+def remove_duplicates(apps, schema_editor):
+    """
+    Two saves of one day racing each other could both write their lessons.
+    The row with the highest pk came from the later save and is kept.
+    """
+
+    Lessons = apps.get_model('Models', 'Lessons')
+
+    seen = set()
+    for pk, ScheduleDay_id, Order in Lessons.objects.order_by('-pk').values_list(
+        'pk', 'ScheduleDay_id', 'Order'
+    ):
+        if (ScheduleDay_id, Order) in seen:
+            Lessons.objects.filter(pk=pk).delete()
+        else:
+            seen.add((ScheduleDay_id, Order))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Models', '0010_schedule_versions'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='lessons',
+            name='Models_less_Schedul_74af0d_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='lessons',
+            constraint=models.UniqueConstraint(fields=('ScheduleDay', 'Order'), name='unique_lesson_order'),
+        ),
+    ]
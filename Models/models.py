@@ -1,11 +1,18 @@
+import json
 from django.db import models
 from django.utils.crypto import get_random_string
 import string
 
 
+class UnicodeJSONEncoder(json.JSONEncoder):
+    # Cyrillic as is: a \uXXXX escape takes 6 bytes, the character 2
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **{**kwargs, "ensure_ascii": False})
+
+
 class Users(models.Model):
 
-    TelegramId = models.BigIntegerField()  # User's telegram_id
+    TelegramId = models.BigIntegerField(unique=True)  # User's telegram_id
     Fullname = models.CharField(
         max_length=32, null=True
     )  # User must provide Fullname during sign up
@@ -31,8 +38,11 @@ class ClassRooms(models.Model):
         return get_random_string(32, allowed_chars=string.ascii_uppercase)
 
     ClassRoomIdentifier = models.CharField(
-        max_length=32, default=generate_identifier
+        max_length=32, default=generate_identifier, unique=True
     )  # For invitational purposes
+    InviteQRFileId = models.CharField(
+        max_length=255, null=True
+    )  # Telegram file_id of the uploaded invite QR code, reused on resend
 
     Number = models.CharField(
         max_length=2, null=True
@@ -41,6 +51,13 @@ class ClassRooms(models.Model):
         max_length=1, null=True
     )  # Class Letter (Ex. A if Class Name is 11 "A")
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["Number", "Letter"], name="unique_classroom_name"
+            )
+        ]
+
 
 class ScheduleDays(models.Model):
 
@@ -61,12 +78,45 @@ class ScheduleDays(models.Model):
         ClassRooms, on_delete=models.CASCADE, related_name="ScheduleDays"
     )
     DayOfWeek = models.PositiveSmallIntegerField(choices=DAY_CHOICES)
+    # Lesson names by Order (position + 1) when the day is stored packed,
+    # see settings.PACKED_SCHEDULES. NULL: the lessons are Lessons rows.
+    LessonNames = models.JSONField(
+        null=True, blank=True, encoder=UnicodeJSONEncoder
+    )
+    # Hash of the lesson names (repository.schedule_hash) and how many times
+    # they changed; "" for a day not saved since hashes were introduced
+    ContentHash = models.CharField(max_length=16, blank=True, default="")
+    Version = models.PositiveIntegerField(default=0)
 
     class Meta:
         unique_together = ("Classroom", "DayOfWeek")
         ordering = ["DayOfWeek"]
 
 
+class ScheduleDayVersions(models.Model):
+    """
+    Lesson names of every saved version of a day, written with each change.
+    """
+
+    ScheduleDay = models.ForeignKey(
+        ScheduleDays, on_delete=models.CASCADE, related_name="Versions"
+    )
+    Version = models.PositiveIntegerField()
+    LessonNames = models.JSONField(encoder=UnicodeJSONEncoder)
+    ContentHash = models.CharField(max_length=16)
+    ChangedBy = models.BigIntegerField(null=True)  # Teacher's TelegramId
+    CreatedAt = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["Version"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ScheduleDay", "Version"],
+                name="unique_schedule_day_version",
+            )
+        ]
+
+
 class Lessons(models.Model):
     ScheduleDay = models.ForeignKey(
         ScheduleDays, on_delete=models.CASCADE, related_name="Lessons"
@@ -76,3 +126,57 @@ class Lessons(models.Model):
 
     class Meta:
         ordering = ["Order"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ScheduleDay", "Order"], name="unique_lesson_order"
+            )
+        ]
+
+
+class Notifications(models.Model):
+    """
+    Outbox of messages for pupils. Rows are written in the same transaction
+    as the change they announce and are drained by outbox.OutboxDispatcher.
+    """
+
+    IdempotencyKey = models.CharField(
+        max_length=64, unique=True
+    )  # One message per change and recipient, never twice
+    Batch = models.CharField(
+        max_length=32
+    )  # All messages about one change share the batch
+    TelegramId = models.BigIntegerField()  # Recipient
+    Text = models.TextField()
+    ParseMode = models.CharField(max_length=16, null=True)
+    ReportTo = models.BigIntegerField(
+        null=True
+    )  # Teacher who is told how many pupils got the batch
+
+    class StatusChoices(models.TextChoices):
+        PENDING = "pending", "В очереди"
+        SENDING = "sending", "Отправляется"
+        SENT = "sent", "Доставлено"
+        FAILED = "failed", "Не доставлено"
+
+    Status = models.CharField(
+        max_length=7,
+        choices=StatusChoices.choices,
+        default=StatusChoices.PENDING,
+    )
+    CreatedAt = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [models.Index(fields=["Status", "id"])]
+
+
+class FSMStates(models.Model):
+    """
+    Persistent aiogram FSM state, written by storage.DjangoStorage.
+    """
+
+    Key = models.CharField(
+        max_length=255, unique=True
+    )  # aiogram storage key (bot, chat, user)
+    State = models.CharField(max_length=255, null=True)
+    Data = models.JSONField(default=dict)
@@ -10,11 +10,17 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from dotenv import load_dotenv
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# The bot and manage.py must see the same database settings
+load_dotenv(BASE_DIR / '.env')
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
@@ -75,12 +81,76 @@ WSGI_APPLICATION = 'MyClassScheduleWebsite.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_PROFILE selects the database: "sqlite" (default) or "postgres"
+# The SQLite transaction_mode/init_command and PostgreSQL pool options need
+# Django 5.1 or later (requirements.txt)
+
+DB_PROFILE = os.getenv('DB_PROFILE', 'sqlite')
+
+if DB_PROFILE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            # One connection for the process, not reopened (and the PRAGMAs
+            # below rerun) on every update
+            'CONN_MAX_AGE': None,
+            'OPTIONS': {
+                # Wait for a competing writer instead of failing with
+                # "database is locked" right away
+                'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 20)),
+                # Take the write lock when the transaction starts: a read
+                # lock upgraded later can't wait out a busy writer
+                'transaction_mode': 'IMMEDIATE',
+                # Readers don't block the writer and vice versa with WAL,
+                # NORMAL sync is durable in WAL mode up to a power loss
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA temp_store=MEMORY;'
+                    'PRAGMA mmap_size=134217728;'
+                    'PRAGMA cache_size=-20000;'
+                ),
+            },
+        }
     }
-}
+elif DB_PROFILE == 'postgres':
+    # Needs psycopg (pip install "psycopg[binary]")
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB', 'myclassschedule'),
+            'USER': os.getenv('POSTGRES_USER', 'myclassschedule'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('POSTGRES_HOST', '127.0.0.1'),
+            'PORT': os.getenv('POSTGRES_PORT', '5432'),
+            # Connections live as long as the process. The bot has no
+            # requests: middlewares.DatabaseConnectionMiddleware drops a
+            # dead one between updates, the health check finds it
+            'CONN_MAX_AGE': None,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+
+    # psycopg's pool (psycopg[pool]) instead of one connection per thread,
+    # Django requires CONN_MAX_AGE = 0 with it
+    if os.getenv('POSTGRES_POOL'):
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': 1,
+            'max_size': int(os.getenv('POSTGRES_POOL_SIZE', 10)),
+        }
+else:
+    raise ValueError('DB_PROFILE must be either sqlite or postgres')
+
+# Store the lessons of a day as one JSON list on ScheduleDays instead of a
+# Lessons row each. Both forms are always read, so the switch can be
+# flipped either way; `manage.py pack_schedules [--unpack]` converts the
+# days already stored.
+PACKED_SCHEDULES = os.getenv('PACKED_SCHEDULES', '').lower() in (
+    '1', 'true', 'yes'
+)
 
 
 # Password validation
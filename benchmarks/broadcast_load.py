@@ -0,0 +1,90 @@
+"""
+Sends one broadcast through broadcast.Broadcaster to the fake Bot API
+server with Telegram-like flood control and some blocked chats, then
+checks the send rates the server saw.
+
+    python benchmarks/broadcast_load.py --chats 300 --blocked-rate 0.05
+
+Exits with 1 when the bot-wide rate went over broadcast.GLOBAL_RATE or a
+chat got more than broadcast.PER_CHAT_RATE messages in a second.
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+
+import common
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+import broadcast
+from fake_telegram import FakeTelegram
+
+PORT = 18083
+
+
+async def run(args) -> int:
+    telegram = FakeTelegram(
+        latency=args.latency,
+        flood_limit=args.flood_limit,
+        retry_after_rate=args.retry_after_rate,
+        blocked_rate=args.blocked_rate,
+        seed=1,
+    )
+    runner = await telegram.start(port=PORT)
+
+    bot = Bot(
+        token=common.os.environ["BOT_TOKEN"],
+        session=AiohttpSession(
+            api=TelegramAPIServer.from_base(f"http://127.0.0.1:{PORT}")
+        ),
+    )
+    chat_ids = [common.PUPIL_ID_OFFSET + index for index in range(args.chats)]
+
+    started = time.perf_counter()
+    result = await broadcast.Broadcaster().send(bot, chat_ids, "Бенчмарк")
+    elapsed = time.perf_counter() - started
+
+    await bot.session.close()
+    await runner.cleanup()
+
+    stats = telegram.stats()
+    counts = telegram.counts()
+
+    print(
+        f"{result.delivered} delivered, {result.failed} failed "
+        f"of {len(chat_ids)} in {elapsed:.1f} s "
+        f"({result.total / elapsed:.1f} msg/s)"
+    )
+    print(
+        f"429 responses: {counts[('sendmessage', 429)]}, "
+        f"403 responses: {counts[('sendmessage', 403)]}"
+    )
+    print(
+        f"max sends in 1 s: {stats['max_send_rate']} bot-wide "
+        f"(limit {broadcast.GLOBAL_RATE}), "
+        f"{stats['max_send_rate_per_chat']} per chat "
+        f"(limit {broadcast.PER_CHAT_RATE})"
+    )
+
+    return int(
+        stats["max_send_rate"] > broadcast.GLOBAL_RATE
+        or stats["max_send_rate_per_chat"] > broadcast.PER_CHAT_RATE
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=300)
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="fake Bot API latency, s"
+    )
+    parser.add_argument("--flood-limit", type=float, default=30)
+    parser.add_argument("--retry-after-rate", type=float, default=0.0)
+    parser.add_argument("--blocked-rate", type=float, default=0.05)
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(run(args)))
@@ -0,0 +1,218 @@
+"""
+Import of a school-wide schedule file (50 classes, 5 days, 8 lessons: 2,000
+lessons by default): parsing CSV and XLSX, the import transaction into an
+empty and into an already filled database, and the whole document update
+through the dispatcher. For comparison, the same schedule entered day by
+day through repository.replace_lessons, as the chat editor does.
+
+    python benchmarks/bulk_import.py --classrooms 50 --lessons 8
+"""
+
+import io
+import csv
+import time
+import asyncio
+import zipfile
+import argparse
+from xml.sax.saxutils import escape
+
+import common
+
+from asgiref.sync import sync_to_async
+
+import main
+import metrics
+import repository
+import schedule_import
+import utils
+from Models.models import ClassRooms, Lessons
+
+HEADER = ["Класс", "День", "Урок", "Предмет"]
+
+
+def make_rows(classrooms: int, lessons: int) -> list[list[str]]:
+    return [
+        [
+            f"{index % 11 + 1}{chr(ord('А') + index // 11)}",
+            utils.DAYS_OF_WEEK[day - 1],
+            str(order),
+            common.SUBJECTS[(order + day + index) % len(common.SUBJECTS)],
+        ]
+        for index in range(classrooms)
+        for day in range(1, 6)
+        for order in range(1, lessons + 1)
+    ]
+
+
+def make_csv(rows: list[list[str]]) -> bytes:
+    text = io.StringIO()
+    writer = csv.writer(text, delimiter=";")
+    writer.writerow(HEADER)
+    writer.writerows(rows)
+    return text.getvalue().encode("utf-8-sig")
+
+
+def make_xlsx(rows: list[list[str]]) -> bytes:
+    """
+    The smallest workbook Excel and LibreOffice open: one sheet of inline
+    strings, numbers as numbers.
+    """
+
+    def cell(column: int, line: int, value: str) -> str:
+        reference = f"{chr(ord('A') + column)}{line}"
+        if value.isdigit():
+            return f'<c r="{reference}"><v>{value}</v></c>'
+        return (
+            f'<c r="{reference}" t="inlineStr">'
+            f"<is><t>{escape(value)}</t></is></c>"
+        )
+
+    sheet_rows = "".join(
+        f'<row r="{line}">'
+        + "".join(
+            cell(column, line, value) for column, value in enumerate(row)
+        )
+        + "</row>"
+        for line, row in enumerate([HEADER, *rows], start=1)
+    )
+
+    files = {
+        "[Content_Types].xml": (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            "</Types>"
+        ),
+        "_rels/.rels": (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+            "</Relationships>"
+        ),
+        "xl/workbook.xml": (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            '<sheets><sheet name="Расписание" sheetId="1" r:id="rId1"/></sheets>'
+            "</workbook>"
+        ),
+        "xl/_rels/workbook.xml.rels": (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+            "</Relationships>"
+        ),
+        "xl/worksheets/sheet1.xml": (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            f"<sheetData>{sheet_rows}</sheetData></worksheet>"
+        ),
+    }
+
+    content = io.BytesIO()
+    with zipfile.ZipFile(content, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+
+    return content.getvalue()
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+async def atimed(coroutine):
+    with metrics.count_queries() as stats:
+        started = time.perf_counter()
+        result = await coroutine
+        elapsed = time.perf_counter() - started
+    return result, elapsed, stats.count
+
+
+@sync_to_async
+def reset_database():
+    Lessons.objects.all().delete()
+    ClassRooms.objects.all().delete()
+
+
+async def run(args):
+
+    await sync_to_async(common.migrate)()
+    await sync_to_async(common.seed)(classrooms=0, pupils_per_classroom=0)
+
+    rows = make_rows(args.classrooms, args.lessons)
+    files = {"schedule.csv": make_csv(rows), "schedule.xlsx": make_xlsx(rows)}
+
+    print(f"{len(rows)} lessons, {args.classrooms} classes")
+
+    for name, content in files.items():
+        parsed, elapsed = timed(
+            schedule_import.parse, io.BytesIO(content), name
+        )
+        print(
+            f"  parse {name:<16} {len(content) / 1024:>7.1f} KiB  "
+            f"{elapsed * 1000:>8.1f} ms"
+        )
+
+    for label in ("import, empty database", "import, replacing"):
+        summary, elapsed, queries = await atimed(
+            repository.import_schedule(parsed)
+        )
+        print(f"  {label:<32} {elapsed * 1000:>8.1f} ms  {queries:>4} queries")
+
+    # The same week typed into the chat editor, one day at a time
+    days = {}
+    for row in parsed:
+        days.setdefault((row.Number, row.Letter, row.day), []).append(
+            row.subject
+        )
+
+    async def day_by_day():
+        for (Number, Letter, day), subjects in days.items():
+            ClassRoom = await repository.get_classroom(Number, Letter)
+            await repository.replace_lessons(ClassRoom, day, subjects)
+
+    await reset_database()
+    await repository.import_schedule(parsed)
+    _, elapsed, queries = await atimed(day_by_day())
+    print(
+        f"  {f'replace_lessons x {len(days)}':<32} {elapsed * 1000:>8.1f} ms  "
+        f"{queries:>4} queries"
+    )
+
+    main.dp.include_router(main.router)
+    bot = common.make_bot()
+
+    for name, content in files.items():
+        await reset_database()
+        repository.invalidate("classrooms")
+
+        bot.session.files[name] = content
+        update = common.document_update(
+            common.TEACHER_ID, name, name, len(content)
+        )
+
+        _, elapsed, queries = await atimed(main.dp.feed_update(bot, update))
+        print(
+            f"  dispatcher update, {name:<14} {elapsed * 1000:>8.1f} ms  "
+            f"{queries:>4} queries"
+        )
+
+    days = await repository.load_days()
+    assert sum(map(len, days.values())) == len(rows)
+
+    await main.dp.storage.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--classrooms", type=int, default=50)
+    parser.add_argument("--lessons", type=int, default=8, help="per day")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
@@ -0,0 +1,97 @@
+"""
+Outgoing messages for a realistic run of schedule edits: every class gets
+each day saved several times, mostly identical resubmits and one-lesson
+fixes. Compares what the outbox receives with the full day sent to every
+pupil on every save, as before content hashes, and the time the sends
+take at broadcast.GLOBAL_RATE.
+
+    python benchmarks/change_notifications.py --classrooms 20 --pupils 30
+"""
+
+import random
+import asyncio
+import argparse
+
+import common
+
+from asgiref.sync import sync_to_async
+
+import utils
+import broadcast
+import repository
+from Models.models import ClassRooms, Notifications
+
+
+def edits(names: list[str], rng: random.Random) -> list[list[str]]:
+    # Save, resubmit, fix a lesson, resubmit the fix, fix another
+    fixed = list(names)
+    fixed[rng.randrange(len(fixed))] = "Биология"
+    fixed_again = list(fixed)
+    fixed_again[rng.randrange(len(fixed_again))] = "Физкультура"
+
+    return [names, names, fixed, fixed, fixed_again]
+
+
+def report(label: str, messages: int, characters: int):
+    print(
+        f"  {label:<28} {messages:>7} messages  "
+        f"{characters / 1024:>8.0f} KiB text  "
+        f"{messages / broadcast.GLOBAL_RATE:>7.0f} s at "
+        f"{broadcast.GLOBAL_RATE} msg/s"
+    )
+
+
+async def run(args):
+
+    await sync_to_async(common.migrate)()
+    await sync_to_async(common.seed)(
+        classrooms=args.classrooms, pupils_per_classroom=args.pupils
+    )
+
+    rng = random.Random(0)
+    saves = 0
+    full_messages = 0
+    full_characters = 0
+
+    async for ClassRoom in ClassRooms.objects.order_by("pk"):
+        for day in range(1, 6):
+            names = await repository.get_lesson_names(ClassRoom.pk, day)
+
+            for lesson_names in edits(names, rng):
+                saves += 1
+
+                # What the editor used to send on every save
+                text = (
+                    "🚨 У тебя обновилось расписание 📢\nТвое новое "
+                    f"расписание на *{utils.DAYS_OF_WEEK[day - 1]}*:\n\n"
+                    + utils.generate_lessons_text(lesson_names)
+                )
+                full_messages += args.pupils
+                full_characters += len(text) * args.pupils
+
+                await repository.replace_lessons(
+                    ClassRoom, day, lesson_names, notify=True
+                )
+
+    messages = await Notifications.objects.acount()
+    characters = sum(
+        [
+            len(text)
+            async for text in Notifications.objects.values_list(
+                "Text", flat=True
+            )
+        ]
+    )
+
+    print(f"{saves} saves, {args.classrooms} classes x {args.pupils} pupils")
+    report("full day on every save", full_messages, full_characters)
+    report("changes only, as diff", messages, characters)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--classrooms", type=int, default=20)
+    parser.add_argument("--pupils", type=int, default=30, help="per class")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
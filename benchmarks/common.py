@@ -0,0 +1,336 @@
+"""
+Shared helpers for the benchmarks in this directory.
+
+Every benchmark runs against a throwaway database (a temporary SQLite
+file, or a test_ copy with DB_PROFILE=postgres, never the configured one)
+and a fake aiogram session, so no request ever reaches Telegram.
+BENCHMARK_SQLITE_DEFAULTS=1 drops the SQLite tuning from settings to
+compare against Django's defaults.
+"""
+
+import os
+import sys
+import atexit
+import logging
+import time
+import asyncio
+import tempfile
+import statistics
+from datetime import datetime
+from itertools import count
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault(
+    "DJANGO_SETTINGS_MODULE", "MyClassScheduleWebsite.settings"
+)
+os.environ.setdefault("BOT_TOKEN", "42:BENCHMARK")
+os.environ.setdefault("ROOT_ADMIN", "1")
+
+_database_dir = tempfile.mkdtemp(prefix="myclassschedule-bench-")
+
+from django.conf import settings
+
+if settings.DB_PROFILE == "sqlite":
+    settings.DATABASES["default"]["NAME"] = os.path.join(
+        _database_dir, "db.sqlite3"
+    )
+
+    if os.getenv("BENCHMARK_SQLITE_DEFAULTS"):
+        settings.DATABASES["default"]["OPTIONS"] = {}
+
+import django
+
+django.setup()
+
+from django.db import connection
+from django.core.management import call_command
+from aiogram import Bot, methods
+from aiogram.client.session.base import BaseSession
+from aiogram.types import (
+    Chat,
+    Document,
+    File,
+    Message,
+    PhotoSize,
+    Update,
+    User,
+)
+
+TEACHER_ID = 1_000_000
+PUPIL_ID_OFFSET = 2_000_000
+SUBJECTS = [
+    "Математика",
+    "Русский язык",
+    "Литература",
+    "Физика",
+    "Химия",
+    "История",
+    "Английский язык",
+    "Информатика",
+]
+
+_ids = count(1)
+
+logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+
+
+class FakeSession(BaseSession):
+    """
+    Answers every Bot API call locally, optionally after `latency` seconds,
+    and counts the calls per method. Documents put into `files` under their
+    file_id can be downloaded; sent documents are read to the end and their
+    sizes kept in `uploads`.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = {}
+        self.files: dict[str, bytes] = {}
+        self.uploads: dict[str, int] = {}
+
+    async def close(self):
+        pass
+
+    async def stream_content(
+        self,
+        url,
+        headers=None,
+        timeout=30,
+        chunk_size=65536,
+        raise_for_status=True,
+    ):
+        content = self.files.get(url.rsplit("/", 1)[-1], b"")
+        for start in range(0, len(content), chunk_size):
+            yield content[start : start + chunk_size]
+
+    async def make_request(self, bot, method, timeout=None):
+        name = type(method).__name__
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if isinstance(method, methods.SendPhoto):
+            file_id = (
+                method.photo
+                if isinstance(method.photo, str)
+                else f"photo-{next(_ids)}"
+            )
+            return Message(
+                message_id=next(_ids),
+                date=datetime.now(),
+                chat=Chat(id=method.chat_id, type="private"),
+                photo=[
+                    PhotoSize(
+                        file_id=file_id,
+                        file_unique_id=file_id,
+                        width=512,
+                        height=512,
+                    )
+                ],
+            )
+        if isinstance(method, methods.SendMessage):
+            return Message(
+                message_id=next(_ids),
+                date=datetime.now(),
+                chat=Chat(id=method.chat_id, type="private"),
+                text=method.text,
+            )
+        if isinstance(method, methods.SendDocument):
+            size = 0
+            async for chunk in method.document.read(bot):
+                size += len(chunk)
+            self.uploads[method.document.filename] = size
+            return Message(
+                message_id=next(_ids),
+                date=datetime.now(),
+                chat=Chat(id=method.chat_id, type="private"),
+                document=Document(
+                    file_id=f"document-{next(_ids)}",
+                    file_unique_id=f"document-{next(_ids)}",
+                    file_name=method.document.filename,
+                    file_size=size,
+                ),
+            )
+        if isinstance(method, methods.GetFile):
+            return File(
+                file_id=method.file_id,
+                file_unique_id=method.file_id,
+                file_path=method.file_id,
+            )
+        if isinstance(method, methods.GetMe):
+            return User(
+                id=bot.id,
+                is_bot=True,
+                first_name="MyClassScheduleBot",
+                username="MyClassScheduleBot",
+            )
+        return True
+
+
+def migrate():
+
+    if settings.DB_PROFILE == "sqlite":
+        call_command("migrate", verbosity=0)
+        return
+
+    # Creates and migrates test_<name>, the configured database is untouched
+    name = settings.DATABASES["default"]["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    atexit.register(connection.creation.destroy_test_db, name, verbosity=0)
+
+
+def seed(
+    classrooms: int = 10,
+    pupils_per_classroom: int = 30,
+    lessons_per_day: int = 6,
+    teachers: int = 1,
+):
+    """
+    Fills the benchmark database with `teachers` teachers (TEACHER_ID and
+    up) and `classrooms` classes, each with a full week of lessons and
+    `pupils_per_classroom` pupils.
+    """
+
+    from Models.models import Users, ClassRooms, ScheduleDays, Lessons
+
+    Users.objects.bulk_create(
+        Users(
+            TelegramId=TEACHER_ID + index,
+            Fullname="Учитель Бенчмарк",
+            UserType=Users.UserTypeChoices.TEACHER,
+        )
+        for index in range(teachers)
+    )
+
+    # 11 parallels, letters go on past "Я" so every class stays unique
+    classroom_objects = ClassRooms.objects.bulk_create(
+        ClassRooms(
+            Number=str(index % 11 + 1), Letter=chr(ord("А") + index // 11)
+        )
+        for index in range(classrooms)
+    )
+
+    def subjects(day: int) -> list[str]:
+        return [
+            SUBJECTS[(order + day) % len(SUBJECTS)]
+            for order in range(lessons_per_day)
+        ]
+
+    if settings.PACKED_SCHEDULES:
+        ScheduleDays.objects.bulk_create(
+            ScheduleDays(
+                Classroom=ClassRoom, DayOfWeek=day, LessonNames=subjects(day)
+            )
+            for ClassRoom in classroom_objects
+            for day in range(1, 6)
+        )
+    else:
+        days = ScheduleDays.objects.bulk_create(
+            ScheduleDays(Classroom=ClassRoom, DayOfWeek=day)
+            for ClassRoom in classroom_objects
+            for day in range(1, 6)
+        )
+        Lessons.objects.bulk_create(
+            Lessons(ScheduleDay=ScheduleDay, Order=order, SubjectName=name)
+            for ScheduleDay in days
+            for order, name in enumerate(
+                subjects(ScheduleDay.DayOfWeek), start=1
+            )
+        )
+    Users.objects.bulk_create(
+        Users(
+            TelegramId=PUPIL_ID_OFFSET + index * pupils_per_classroom + pupil,
+            Fullname=f"Ученик {pupil}",
+            ClassRoom=ClassRoom,
+            UserType=Users.UserTypeChoices.PUPIL,
+        )
+        for index, ClassRoom in enumerate(classroom_objects)
+        for pupil in range(pupils_per_classroom)
+    )
+
+    return classroom_objects
+
+
+def make_bot(latency: float = 0.0) -> Bot:
+    return Bot(token=os.environ["BOT_TOKEN"], session=FakeSession(latency))
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": "Bench"}
+
+
+def message_update(user_id: int, text: str) -> Update:
+    return Update.model_validate(
+        {
+            "update_id": next(_ids),
+            "message": {
+                "message_id": next(_ids),
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": _user(user_id),
+                "text": text,
+            },
+        }
+    )
+
+
+def document_update(
+    user_id: int, file_id: str, file_name: str, file_size: int
+) -> Update:
+    return Update.model_validate(
+        {
+            "update_id": next(_ids),
+            "message": {
+                "message_id": next(_ids),
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": _user(user_id),
+                "document": {
+                    "file_id": file_id,
+                    "file_unique_id": file_id,
+                    "file_name": file_name,
+                    "file_size": file_size,
+                },
+            },
+        }
+    )
+
+
+def callback_update(user_id: int, data: str) -> Update:
+    return Update.model_validate(
+        {
+            "update_id": next(_ids),
+            "callback_query": {
+                "id": str(next(_ids)),
+                "from": _user(user_id),
+                "chat_instance": "bench",
+                "data": data,
+                "message": {
+                    "message_id": next(_ids),
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "text": "bench",
+                },
+            },
+        }
+    )
+
+
+def percentile(samples: list, q: float) -> float:
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method="inclusive")[int(q) - 1]
+
+
+def report(name: str, latencies: list, elapsed: float):
+    print(
+        f"{name:<32} {len(latencies):>6} updates  "
+        f"{len(latencies) / elapsed:>9.1f} upd/s  "
+        f"p50 {percentile(latencies, 50) * 1000:>7.2f} ms  "
+        f"p99 {percentile(latencies, 99) * 1000:>7.2f} ms"
+    )
@@ -0,0 +1,58 @@
+"""
+Measures how many pupil schedule lookups per second the dispatcher handles
+when many updates arrive at once.
+
+    python benchmarks/concurrent_updates.py --concurrency 50 --updates 2000
+
+Run it on two revisions to compare them.
+"""
+
+import time
+import asyncio
+import argparse
+
+import common
+
+import main
+import keyboards
+
+
+async def run(concurrency: int, updates: int, latency: float):
+    main.bot = common.make_bot(latency)
+    main.dp.include_router(main.router)
+
+    pupils = [common.PUPIL_ID_OFFSET + index for index in range(600)]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def feed(index: int):
+        pupil = pupils[index % len(pupils)]
+        data = keyboards.ScheduleDayCallback(day=index % 5 + 1).pack()
+
+        async with semaphore:
+            started = time.perf_counter()
+            await main.dp.feed_update(
+                main.bot, common.callback_update(pupil, data)
+            )
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(feed(index) for index in range(updates)))
+    elapsed = time.perf_counter() - started
+
+    common.report(f"schedule day x{concurrency}", latencies, elapsed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="fake Bot API latency, s"
+    )
+    args = parser.parse_args()
+
+    common.migrate()
+    common.seed(classrooms=20, pupils_per_classroom=30)
+
+    asyncio.run(run(args.concurrency, args.updates, args.latency))
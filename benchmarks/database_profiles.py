@@ -0,0 +1,155 @@
+"""
+Concurrent read/write mix against each database profile: several worker
+processes (like BOT_WORKERS) read day schedules and save days with
+notifications through repository, at the same time, for a fixed time.
+
+    python benchmarks/database_profiles.py --workers 4 --seconds 10
+    DB_PROFILE=postgres POSTGRES_DB=... python benchmarks/database_profiles.py
+
+"sqlite-defaults" is SQLite with Django's default options, "sqlite" the
+tuned profile from settings. With DB_PROFILE=postgres the postgres
+profile runs instead, on a throwaway test_ database.
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+import multiprocessing
+
+import common
+
+from django.conf import settings
+from django.db import OperationalError, connections
+
+import repository
+
+ctx = multiprocessing.get_context("fork")
+
+
+def worker(index: int, args, classrooms: list, results):
+    """
+    Runs for `args.seconds` and reports (op, latency) samples and errors.
+    """
+
+    connections.close_all()
+    rng = random.Random(index)
+
+    async def work():
+        samples = []
+        errors = {}
+        deadline = time.perf_counter() + args.seconds
+
+        while time.perf_counter() < deadline:
+            ClassRoom = rng.choice(classrooms)
+            day = rng.randint(1, 5)
+            op = "write" if rng.random() < args.write_ratio else "read"
+
+            started = time.perf_counter()
+            try:
+                if op == "write":
+                    await repository.replace_lessons(
+                        ClassRoom,
+                        day,
+                        rng.sample(common.SUBJECTS, 6),
+                        notify=True,
+                    )
+                else:
+                    await repository.get_lesson_names(ClassRoom.pk, day)
+            except OperationalError as error:
+                errors[str(error)] = errors.get(str(error), 0) + 1
+                continue
+
+            samples.append((op, time.perf_counter() - started))
+
+        return samples, errors
+
+    results.put(asyncio.run(work()))
+
+
+def run(profile: str, args):
+    common.migrate()
+    classrooms = common.seed(
+        classrooms=args.classrooms, pupils_per_classroom=30
+    )
+
+    # Forked workers must not share the parent's connection
+    connections.close_all()
+
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(target=worker, args=(index, args, classrooms, results))
+        for index in range(args.workers)
+    ]
+
+    for process in processes:
+        process.start()
+
+    samples, errors = [], {}
+    for _ in processes:
+        # A worker that crashed never reports, don't wait for it forever
+        worker_samples, worker_errors = results.get(timeout=args.seconds + 60)
+        samples += worker_samples
+        for error, amount in worker_errors.items():
+            errors[error] = errors.get(error, 0) + amount
+
+    for process in processes:
+        process.join()
+
+    print(
+        f"{profile}: {args.workers} workers, "
+        f"{args.write_ratio:.0%} writes, {args.seconds} s"
+    )
+
+    for op in ("read", "write"):
+        latencies = [latency for kind, latency in samples if kind == op]
+        if latencies:
+            common.report(f"  {op}", latencies, args.seconds)
+
+    for error, amount in errors.items():
+        print(f"  {amount} x {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--classrooms", type=int, default=50)
+    parser.add_argument(
+        "--write-ratio", type=float, nargs="+", default=[0.1, 0.5]
+    )
+    parser.add_argument("--profile", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        args.write_ratio = args.write_ratio[-1]
+        run(args.profile, args)
+        sys.exit()
+
+    if settings.DB_PROFILE == "postgres":
+        profiles = {"postgres": {}}
+    else:
+        profiles = {
+            "sqlite-defaults": {"BENCHMARK_SQLITE_DEFAULTS": "1"},
+            "sqlite": {},
+        }
+
+    # A fresh process per profile and mix, settings are read once
+    for write_ratio in args.write_ratio:
+        for profile, env in profiles.items():
+            subprocess.run(
+                [
+                    sys.executable,
+                    __file__,
+                    *sys.argv[1:],
+                    "--write-ratio",
+                    str(write_ratio),
+                    "--profile",
+                    profile,
+                ],
+                env={**os.environ, **env},
+                check=True,
+            )
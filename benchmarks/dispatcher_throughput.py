@@ -0,0 +1,203 @@
+"""
+End-to-end throughput of every user flow through dp.feed_update, on seeded
+databases of increasing size:
+
+    python benchmarks/dispatcher_throughput.py --sizes 10 100 500
+
+A flow is the sequence of updates one user sends (e.g. "Класс 📖", then
+the parallel, then the class). Many users run their flows concurrently,
+p50/p99 are per update. Every size runs in a fresh process with its own
+database and empty caches.
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+import subprocess
+from itertools import count
+
+import common
+
+import main
+import keyboards
+from Models.models import ClassRooms
+
+NEW_USERS = count(3_000_000)
+
+
+def teacher_callback(teacher: int, data):
+    return common.callback_update(teacher, data.pack())
+
+
+def start_with_invite(identifiers, index):
+    user = next(NEW_USERS)
+    return [
+        common.message_update(
+            user, f"/start {identifiers[index % len(identifiers)]}"
+        )
+    ]
+
+
+def sign_up(identifiers, index):
+    user = next(NEW_USERS)
+    return [
+        common.message_update(
+            user, f"/start {identifiers[index % len(identifiers)]}"
+        ),
+        common.message_update(user, "Иванов Иван"),
+    ]
+
+
+def pupil_schedule(pupils, index):
+    pupil = common.PUPIL_ID_OFFSET + index % pupils
+    return [
+        common.message_update(pupil, "Моё расписание 📝"),
+        common.callback_update(
+            pupil, keyboards.ScheduleDayCallback(day=index % 5 + 1).pack()
+        ),
+    ]
+
+
+def teacher_navigation(classrooms, teachers, index):
+    teacher = common.TEACHER_ID + index % teachers
+    ClassRoom_id, Number = classrooms[index % len(classrooms)]
+    return [
+        common.message_update(teacher, "Класс 📖"),
+        teacher_callback(
+            teacher, keyboards.ClassRoomsActionsCallback(action="view_all")
+        ),
+        teacher_callback(
+            teacher,
+            keyboards.ViewClassRoomsCallback(
+                class_number=Number, purpose="view_classrooms"
+            ),
+        ),
+        teacher_callback(
+            teacher,
+            keyboards.ViewClassRoomCallback(
+                classroom_id=ClassRoom_id, purpose="view_classrooms"
+            ),
+        ),
+    ]
+
+
+def schedule_editing(classrooms, teachers, index):
+    teacher = common.TEACHER_ID + index % teachers
+    ClassRoom_id, _ = classrooms[index % len(classrooms)]
+    day = index % 5 + 1
+    lessons = [
+        common.SUBJECTS[(day + order + index) % len(common.SUBJECTS)]
+        for order in range(6)
+    ]
+    return [
+        teacher_callback(
+            teacher,
+            keyboards.EditScheduleCallback(classroom_id=ClassRoom_id, day=day),
+        ),
+        common.message_update(teacher, "\n".join(lessons)),
+    ]
+
+
+async def run_flow(name: str, flows: list, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def user(updates):
+        async with semaphore:
+            for update in updates:
+                started = time.perf_counter()
+                await main.dp.feed_update(main.bot, update)
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(updates) for updates in flows))
+    await main.dp.storage.close()
+    elapsed = time.perf_counter() - started
+
+    common.report(name, latencies, elapsed)
+
+
+async def run(args):
+    main.bot = common.make_bot(args.latency)
+    main.dp.include_router(main.router)
+
+    classrooms = [
+        (pk, int(Number))
+        async for pk, Number in ClassRooms.objects.values_list("pk", "Number")
+    ]
+    identifiers = [
+        identifier
+        async for identifier in ClassRooms.objects.values_list(
+            "ClassRoomIdentifier", flat=True
+        )
+    ]
+    pupils = len(classrooms) * args.pupils
+    teachers = args.teachers
+    users = range(args.users)
+
+    flows = {
+        "deep-link /start": [
+            start_with_invite(identifiers, index) for index in users
+        ],
+        "pupil sign-up": [sign_up(identifiers, index) for index in users],
+        "Моё расписание": [pupil_schedule(pupils, index) for index in users],
+        "teacher navigation": [
+            teacher_navigation(classrooms, teachers, index) for index in users
+        ],
+        "schedule editing": [
+            schedule_editing(classrooms, teachers, index) for index in users
+        ],
+    }
+
+    print(
+        f"{len(classrooms)} classes, {pupils} pupils, "
+        f"{teachers} teachers, {args.users} users per flow"
+    )
+
+    for name, flow in flows.items():
+        await run_flow(name, flow, args.concurrency)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10, 100, 500],
+        help="classes in the seeded database, one run per size",
+    )
+    parser.add_argument("--pupils", type=int, default=30, help="per class")
+    parser.add_argument("--teachers", type=int, default=20)
+    parser.add_argument("--users", type=int, default=200, help="per flow")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="fake Bot API latency, s"
+    )
+    args = parser.parse_args()
+
+    if len(args.sizes) > 1:
+        # A fresh process per size: new database, cold caches
+        for size in args.sizes:
+            subprocess.run(
+                [
+                    sys.executable,
+                    __file__,
+                    *sys.argv[1:],
+                    "--sizes",
+                    str(size),
+                ],
+                check=True,
+            )
+            print()
+        sys.exit()
+
+    common.migrate()
+    common.seed(
+        classrooms=args.sizes[0],
+        pupils_per_classroom=args.pupils,
+        teachers=args.teachers,
+    )
+
+    asyncio.run(run(args))
@@ -0,0 +1,101 @@
+"""
+Time, SQL statements and peak memory of every export in schedule_export,
+streamed chunk by chunk, next to the same file collected in memory, and
+of /export through the dispatcher with the upload read to the end.
+
+    python benchmarks/export.py --classrooms 300 --pupils 30
+"""
+
+import time
+import asyncio
+import argparse
+import tracemalloc
+
+import common
+
+from asgiref.sync import sync_to_async
+
+import main
+import metrics
+import schedule_export
+
+
+async def measure(coroutine):
+    tracemalloc.start()
+
+    with metrics.count_queries() as stats:
+        started = time.perf_counter()
+        result = await coroutine
+        elapsed = time.perf_counter() - started
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, elapsed, stats.count, peak
+
+
+async def stream(export) -> int:
+    size = 0
+    async for chunk in export():
+        size += len(chunk)
+    return size
+
+
+async def collect(export) -> int:
+    return len(b"".join([chunk async for chunk in export()]))
+
+
+def row(name: str, size: int, elapsed: float, queries: int, peak: int):
+    print(
+        f"  {name:<28} {size / 1024:>8.0f} KiB  {elapsed * 1000:>8.1f} ms  "
+        f"{queries:>4} queries  peak {peak / 1024:>8.0f} KiB"
+    )
+
+
+async def run(args):
+
+    await sync_to_async(common.migrate)()
+    await sync_to_async(common.seed)(
+        classrooms=args.classrooms,
+        pupils_per_classroom=args.pupils,
+        lessons_per_day=args.lessons,
+    )
+
+    print(
+        f"{args.classrooms} classes, {args.classrooms * args.pupils} pupils, "
+        f"{args.classrooms * args.lessons * 5} lessons"
+    )
+
+    for name, export in schedule_export.EXPORTS.items():
+        for label, consume in (("streamed", stream), ("in memory", collect)):
+            size, elapsed, queries, peak = await measure(consume(export))
+            row(f"{name}, {label}", size, elapsed, queries, peak)
+
+    main.dp.include_router(main.router)
+    bot = common.make_bot()
+
+    for text in ("/export", "/export json"):
+        update = common.message_update(common.TEACHER_ID, text)
+        _, elapsed, queries, peak = await measure(
+            main.dp.feed_update(bot, update)
+        )
+        row(
+            f"dispatcher {text}",
+            sum(bot.session.uploads.values()),
+            elapsed,
+            queries,
+            peak,
+        )
+        bot.session.uploads.clear()
+
+    await main.dp.storage.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--classrooms", type=int, default=300)
+    parser.add_argument("--pupils", type=int, default=30, help="per class")
+    parser.add_argument("--lessons", type=int, default=8, help="per day")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
@@ -0,0 +1,308 @@
+"""
+Local stand-in for the part of the Bot API this bot uses, for load and
+latency tests that must not touch real Telegram.
+
+    python benchmarks/fake_telegram.py --port 8081 --latency 0.05 \\
+        --flood-limit 30 --blocked-rate 0.02
+
+Point the bot at it with TELEGRAM_API_URL=http://127.0.0.1:8081. Request
+counts and rates are served as JSON on GET /stats.
+
+Besides getMe and the webhook calls it implements sendMessage, sendPhoto,
+deleteMessage, getUpdates and answerCallbackQuery, and can inject latency,
+429 "retry after" and 403 "bot was blocked" responses.
+"""
+
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter, defaultdict, deque
+from itertools import count
+from typing import Union
+
+from aiohttp import web
+
+BLOCKED = "Forbidden: bot was blocked by the user"
+
+
+class FakeTelegram:
+    """
+    `latency` is added to every call. Sends get a 429 with `retry_after`
+    when they go over `flood_limit` per second (bot-wide) or at random with
+    `retry_after_rate`, and a 403 for chats in `blocked_chats` or at random
+    with `blocked_rate`.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        flood_limit: Union[float, None] = None,
+        retry_after: int = 1,
+        retry_after_rate: float = 0.0,
+        blocked_rate: float = 0.0,
+        blocked_chats: tuple = (),
+        seed: Union[int, None] = None,
+    ):
+        self.latency = latency
+        self.flood_limit = flood_limit
+        self.retry_after = retry_after
+        self.retry_after_rate = retry_after_rate
+        self.blocked_rate = blocked_rate
+        self.blocked_chats = set(blocked_chats)
+        self.random = random.Random(seed)
+
+        # (time, method, chat_id, status) of every call
+        self.requests: list[tuple[float, str, Union[int, None], int]] = []
+        self.updates: list[dict] = []
+        self._new_update = asyncio.Event()
+        self._sends = deque()
+        self._waiters = defaultdict(list)
+        self._ids = count(1)
+
+    # Recording
+
+    def record(self, method: str, chat_id: Union[int, None], status: int):
+
+        now = time.perf_counter()
+        self.requests.append((now, method, chat_id, status))
+
+        if status == 200:
+            for future in self._waiters.pop((method, chat_id), []):
+                if not future.done():
+                    future.set_result(now)
+
+    def expect(self, method: str, chat_id: int) -> asyncio.Future:
+        """
+        Resolves with the perf_counter time of the next successful
+        `method` call for `chat_id`.
+        """
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[(method.lower(), chat_id)].append(future)
+        return future
+
+    def counts(self) -> Counter:
+        return Counter(
+            (method, status) for _, method, _, status in self.requests
+        )
+
+    def max_rate(
+        self, method: str, window: float = 1.0, per_chat: bool = False
+    ) -> int:
+        """
+        Most successful `method` calls seen within any `window` seconds,
+        bot-wide or for the busiest single chat.
+        """
+
+        times = defaultdict(list)
+
+        for at, name, chat_id, status in self.requests:
+            if name == method.lower() and status == 200:
+                times[chat_id if per_chat else None].append(at)
+
+        best = 0
+
+        for series in times.values():
+            start = 0
+            for end, at in enumerate(series):
+                while at - series[start] > window:
+                    start += 1
+                best = max(best, end - start + 1)
+
+        return best
+
+    def stats(self) -> dict:
+        return {
+            "requests": len(self.requests),
+            "counts": {
+                f"{method} {status}": amount
+                for (method, status), amount in self.counts().items()
+            },
+            "max_send_rate": self.max_rate("sendmessage"),
+            "max_send_rate_per_chat": self.max_rate(
+                "sendmessage", per_chat=True
+            ),
+        }
+
+    # Updates
+
+    def push_update(self, update: dict):
+        self.updates.append(update)
+        self._new_update.set()
+
+    # Bot API
+
+    def _error(self, code: int, description: str, **parameters):
+        return web.json_response(
+            {
+                "ok": False,
+                "error_code": code,
+                "description": description,
+                **({"parameters": parameters} if parameters else {}),
+            },
+            status=code,
+        )
+
+    def _ok(self, result) -> web.Response:
+        return web.json_response({"ok": True, "result": result})
+
+    def _message(self, chat_id: int, **fields) -> dict:
+        return {
+            "message_id": next(self._ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            **fields,
+        }
+
+    def _send_refused(self, chat_id: int) -> Union[web.Response, None]:
+
+        now = time.perf_counter()
+
+        if self.flood_limit:
+            while self._sends and now - self._sends[0] > 1:
+                self._sends.popleft()
+
+            if len(self._sends) >= self.flood_limit:
+                return self._error(
+                    429,
+                    f"Too Many Requests: retry after {self.retry_after}",
+                    retry_after=self.retry_after,
+                )
+
+        if self.random.random() < self.retry_after_rate:
+            return self._error(
+                429,
+                f"Too Many Requests: retry after {self.retry_after}",
+                retry_after=self.retry_after,
+            )
+
+        if (
+            chat_id in self.blocked_chats
+            or self.random.random() < self.blocked_rate
+        ):
+            return self._error(403, BLOCKED)
+
+        self._sends.append(now)
+
+    async def _get_updates(self, params: dict) -> list[dict]:
+
+        offset = int(params.get("offset") or 0)
+        self.updates = [
+            update for update in self.updates if update["update_id"] >= offset
+        ]
+
+        if not self.updates:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(
+                    self._new_update.wait(), float(params.get("timeout") or 0)
+                )
+            except asyncio.TimeoutError:
+                pass
+
+        return self.updates
+
+    async def handle(self, request: web.Request) -> web.Response:
+
+        method = request.match_info["method"].lower()
+        params = dict(await request.post())
+        chat_id = int(params["chat_id"]) if "chat_id" in params else None
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        match method:
+            case "getme":
+                response = self._ok(
+                    {
+                        "id": int(request.match_info["token"].split(":")[0]),
+                        "is_bot": True,
+                        "first_name": "MyClassScheduleBot",
+                        "username": "MyClassScheduleBot",
+                    }
+                )
+            case "getupdates":
+                response = self._ok(await self._get_updates(params))
+            case "sendmessage":
+                response = self._send_refused(chat_id) or self._ok(
+                    self._message(chat_id, text=params.get("text"))
+                )
+            case "sendphoto":
+                photo = params.get("photo")
+                file_id = (
+                    photo
+                    if isinstance(photo, str)
+                    else f"photo-{next(self._ids)}"
+                )
+                response = self._send_refused(chat_id) or self._ok(
+                    self._message(
+                        chat_id,
+                        photo=[
+                            {
+                                "file_id": file_id,
+                                "file_unique_id": file_id,
+                                "width": 512,
+                                "height": 512,
+                            }
+                        ],
+                    )
+                )
+            case (
+                "deletemessage"
+                | "answercallbackquery"
+                | "setwebhook"
+                | "deletewebhook"
+            ):
+                response = self._ok(True)
+            case _:
+                response = self._error(404, "Not Found")
+
+        self.record(method, chat_id, response.status)
+
+        return response
+
+    def create_app(self) -> web.Application:
+
+        async def stats(request: web.Request) -> web.Response:
+            return web.json_response(self.stats())
+
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        app.router.add_get("/stats", stats)
+
+        return app
+
+    async def start(
+        self, host: str = "127.0.0.1", port: int = 8081
+    ) -> web.AppRunner:
+
+        runner = web.AppRunner(self.create_app())
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+
+        return runner
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="s")
+    parser.add_argument(
+        "--flood-limit", type=float, help="sends per second before 429"
+    )
+    parser.add_argument("--retry-after", type=int, default=1, help="s")
+    parser.add_argument("--retry-after-rate", type=float, default=0.0)
+    parser.add_argument("--blocked-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    telegram = FakeTelegram(
+        latency=args.latency,
+        flood_limit=args.flood_limit,
+        retry_after=args.retry_after,
+        retry_after_rate=args.retry_after_rate,
+        blocked_rate=args.blocked_rate,
+    )
+
+    web.run_app(telegram.create_app(), host=args.host, port=args.port)
@@ -0,0 +1,79 @@
+"""
+Pupil sign-up flow (/start <invite> + full name) with aiogram's
+MemoryStorage and with the database-backed storage.DjangoStorage.
+
+    python benchmarks/fsm_storage.py --pupils 500 --concurrency 20
+"""
+
+import time
+import asyncio
+import argparse
+
+import common
+
+from aiogram.fsm.storage.memory import MemoryStorage
+
+import main
+import storage
+import repository
+from Models.models import ClassRooms
+
+
+async def sign_up(fsm_storage, first_id: int, pupils: int, concurrency: int):
+    main.dp.fsm.storage = fsm_storage
+
+    identifier = await ClassRooms.objects.values_list(
+        "ClassRoomIdentifier", flat=True
+    ).afirst()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    saves = 0
+    save_fsm_states = repository.save_fsm_states
+
+    async def counting_save(records):
+        nonlocal saves
+        saves += 1
+        return await save_fsm_states(records)
+
+    repository.save_fsm_states = counting_save
+
+    async def pupil(telegram_id: int):
+        async with semaphore:
+            for text in (f"/start {identifier}", "Иванов Иван"):
+                started = time.perf_counter()
+                await main.dp.feed_update(
+                    main.bot, common.message_update(telegram_id, text)
+                )
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(pupil(first_id + index) for index in range(pupils)))
+    await fsm_storage.close()
+    elapsed = time.perf_counter() - started
+
+    repository.save_fsm_states = save_fsm_states
+
+    common.report(type(fsm_storage).__name__, latencies, elapsed)
+    if saves:
+        print(f"{'':<32} {saves} FSM flushes for {len(latencies)} updates")
+
+
+async def run(pupils: int, concurrency: int):
+    main.bot = common.make_bot()
+
+    await sign_up(MemoryStorage(), 10_000_000, pupils, concurrency)
+    await sign_up(storage.DjangoStorage(), 20_000_000, pupils, concurrency)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pupils", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    common.migrate()
+    common.seed(classrooms=1, pupils_per_classroom=0)
+    main.dp.include_router(main.router)
+
+    asyncio.run(run(args.pupils, args.concurrency))
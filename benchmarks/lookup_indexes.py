@@ -0,0 +1,105 @@
+"""
+Cost of the per-handler lookups on a large school, with and without the
+indexes and unique constraints from migration 0006.
+
+    python benchmarks/lookup_indexes.py --users 100000 --classrooms 2000
+"""
+
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+import common
+
+from django.core.management import call_command
+
+import repository
+from Models.models import ClassRooms
+
+LOOKUPS = {
+    "/start (user by TelegramId)": lambda key: (
+        repository.load_identity(key["pupil"])
+    ),
+    "deep link (ClassRoomIdentifier)": lambda key: (
+        repository.classroom_exists_by_identifier(key["identifier"])
+    ),
+    "classroom callback (pk)": lambda key: (
+        repository.get_classroom_by_id(key["pk"])
+    ),
+    "old classroom callback (Number, Letter)": lambda key: (
+        repository.get_classroom(key["number"], key["letter"])
+    ),
+}
+
+
+async def schedule_day(key):
+    identity = await repository.load_identity(key["pupil"])
+    # Measure the database, not the rendered schedule cache
+    repository.schedule_cache.clear()
+    return await repository.get_schedule_text(identity.ClassRoom_id, 3)
+
+
+LOOKUPS["ScheduleDayCallback (pupil + day)"] = schedule_day
+
+
+async def measure(keys):
+    results = {}
+
+    for name, lookup in LOOKUPS.items():
+        latencies = []
+
+        for key in keys:
+            started = time.perf_counter()
+            await lookup(key)
+            latencies.append(time.perf_counter() - started)
+
+        results[name] = statistics.median(latencies)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--classrooms", type=int, default=2_000)
+    parser.add_argument("--lookups", type=int, default=500)
+    args = parser.parse_args()
+
+    common.migrate()
+    common.seed(
+        classrooms=args.classrooms,
+        pupils_per_classroom=args.users // args.classrooms,
+    )
+
+    classrooms = list(
+        ClassRooms.objects.values_list(
+            "pk", "ClassRoomIdentifier", "Number", "Letter"
+        )
+    )
+    keys = [
+        {
+            "pupil": common.PUPIL_ID_OFFSET + random.randrange(args.users),
+            "pk": pk,
+            "identifier": identifier,
+            "number": number,
+            "letter": letter,
+        }
+        for pk, identifier, number, letter in random.choices(
+            classrooms, k=args.lookups
+        )
+    ]
+
+    after = asyncio.run(measure(keys))
+
+    # Roll back to the schema without the lookup indexes and measure again
+    call_command("migrate", "Models", "0005", verbosity=0)
+    before = asyncio.run(measure(keys))
+
+    print(f"{'lookup':<42} {'before':>10} {'after':>10}")
+    for name in LOOKUPS:
+        print(
+            f"{name:<42} {before[name] * 1000:>7.3f} ms "
+            f"{after[name] * 1000:>7.3f} ms"
+        )
@@ -0,0 +1,72 @@
+"""
+Measures update throughput of the supervisor with 1, 2, 4 and 8 worker
+processes. Updates are pupil schedule lookups sharded by user id.
+
+    python benchmarks/multiprocess_throughput.py --updates 4000 --latency 0.05
+
+Worker startup is excluded, the clock stops once every worker has drained
+its inbox and exited.
+"""
+
+import time
+import argparse
+
+import common
+
+from django.db import connections
+
+import main
+import keyboards
+import supervisor
+
+
+async def start_worker(worker_bot, index):
+    main.bot = worker_bot
+
+
+def run(workers: int, updates: int, latency: float):
+    pool = supervisor.Supervisor(
+        workers, main.dp, lambda: common.make_bot(latency), start_worker
+    )
+
+    pupils = [common.PUPIL_ID_OFFSET + index for index in range(600)]
+    batch = [
+        common.callback_update(
+            pupils[index % len(pupils)],
+            keyboards.ScheduleDayCallback(day=index % 5 + 1).pack(),
+        )
+        for index in range(updates)
+    ]
+
+    # Forked workers must not inherit an open SQLite connection
+    connections.close_all()
+    pool.start()
+    time.sleep(1)
+
+    started = time.perf_counter()
+    for update in batch:
+        pool.route(update)
+    pool.stop()
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"{workers} worker(s): {updates} updates in {elapsed:.2f} s, "
+        f"{updates / elapsed:.0f} updates/s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=4000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="fake Bot API latency, s"
+    )
+    args = parser.parse_args()
+
+    common.migrate()
+    common.seed(classrooms=20, pupils_per_classroom=30)
+    main.dp.include_router(main.router)
+
+    for workers in args.workers:
+        run(workers, args.updates, args.latency)
@@ -0,0 +1,166 @@
+"""
+Lessons stored as rows vs packed on ScheduleDays (PACKED_SCHEDULES) on a
+large seeded school: row counts, size of the schedule tables, latency and
+SQL statements of every schedule read, and of saving a day.
+
+    python benchmarks/packed_schedules.py --classrooms 2000 --repeat 500
+
+"rows" and "packed" are seeded in their own form; "packed, unconverted"
+runs with PACKED_SCHEDULES on rows written before it was switched on, the
+state before `manage.py pack_schedules` has run.
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+
+import common
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+
+import metrics
+import repository
+from Models.models import ClassRooms, ScheduleDays, Lessons
+
+PROFILES = {
+    "rows": {},
+    "packed": {"PACKED_SCHEDULES": "1"},
+    "packed, unconverted": {"PACKED_SCHEDULES": "1"},
+}
+
+
+def table_sizes() -> dict[str, int]:
+    """
+    Bytes used by each schedule table, its indexes included.
+    """
+
+    tables = [ScheduleDays._meta.db_table, Lessons._meta.db_table]
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("VACUUM")
+            cursor.execute(
+                "SELECT m.tbl_name, SUM(s.pgsize) FROM dbstat s "
+                "JOIN sqlite_master m ON m.name = s.name GROUP BY m.tbl_name"
+            )
+        else:
+            cursor.execute(
+                "SELECT relname, pg_total_relation_size(oid) FROM pg_class "
+                "WHERE relname = ANY(%s)",
+                [[table.lower() for table in tables]],
+            )
+        sizes = {name.lower(): size for name, size in cursor.fetchall()}
+
+    return {table: sizes.get(table.lower(), 0) for table in tables}
+
+
+async def measure(name: str, operation, repeat: int):
+    latencies = []
+    queries = 0
+
+    for _ in range(repeat):
+        repository.schedule_cache.clear()
+
+        with metrics.count_queries() as stats:
+            started = time.perf_counter()
+            await operation()
+            latencies.append(time.perf_counter() - started)
+
+        queries = max(queries, stats.count)
+
+    print(
+        f"  {name:<22} p50 {common.percentile(latencies, 50) * 1000:>7.2f} ms"
+        f"  p99 {common.percentile(latencies, 99) * 1000:>7.2f} ms"
+        f"  {queries:>2} queries"
+    )
+
+
+async def run(profile: str, args):
+
+    await sync_to_async(common.migrate)()
+
+    packed = settings.PACKED_SCHEDULES
+
+    if profile == "packed, unconverted":
+        settings.PACKED_SCHEDULES = False
+
+    await sync_to_async(common.seed)(
+        classrooms=args.classrooms,
+        pupils_per_classroom=args.pupils,
+        lessons_per_day=args.lessons,
+    )
+    settings.PACKED_SCHEDULES = packed
+
+    sizes = await sync_to_async(table_sizes)()
+    print(
+        f"{profile}: {await ScheduleDays.objects.acount()} days, "
+        f"{await Lessons.objects.acount()} lesson rows, "
+        + ", ".join(
+            f"{table} {size / 1024 / 1024:.1f} MiB"
+            for table, size in sizes.items()
+        )
+        + f", {sum(sizes.values()) / 1024 / 1024:.1f} MiB"
+    )
+
+    classrooms = [
+        ClassRoom async for ClassRoom in ClassRooms.objects.order_by("pk")
+    ]
+    rng = random.Random(0)
+
+    def pick():
+        return rng.choice(classrooms), rng.randint(1, 5)
+
+    async def lesson_names():
+        ClassRoom, day = pick()
+        await repository.get_lesson_names(ClassRoom.pk, day)
+
+    async def day_text():
+        ClassRoom, day = pick()
+        await repository.get_schedule_text(ClassRoom.pk, day)
+
+    async def week_text():
+        ClassRoom, _ = pick()
+        await repository.get_week_schedule_text(ClassRoom.pk)
+
+    async def digests():
+        await repository.get_day_digests(rng.randint(1, 5))
+
+    async def save_day():
+        ClassRoom, day = pick()
+        await repository.replace_lessons(
+            ClassRoom, day, rng.sample(common.SUBJECTS, args.lessons)
+        )
+
+    await measure("day, editor lines", lesson_names, args.repeat)
+    await measure("day, rendered", day_text, args.repeat)
+    await measure("week, rendered", week_text, args.repeat)
+    await measure("morning digest", digests, max(1, args.repeat // 100))
+    await measure("save day", save_day, args.repeat)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--classrooms", type=int, default=2000)
+    parser.add_argument("--pupils", type=int, default=5, help="per class")
+    parser.add_argument("--lessons", type=int, default=7, help="per day")
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--profile", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        asyncio.run(run(args.profile, args))
+        sys.exit()
+
+    # A fresh process and database per profile, settings are read once
+    for profile, env in PROFILES.items():
+        subprocess.run(
+            [sys.executable, __file__, *sys.argv[1:], "--profile", profile],
+            env={**os.environ, **env},
+            check=True,
+        )
@@ -0,0 +1,72 @@
+"""
+Event-loop lag seen by other users while several teachers render invite QR
+codes at once, with rendering inline on the loop versus in the worker pool.
+
+    python benchmarks/qr_event_loop.py --teachers 8
+"""
+
+import time
+import asyncio
+import argparse
+
+import common
+
+import qr
+import utils
+
+TICK = 0.005
+
+
+async def measure_lag(stop: asyncio.Event) -> list:
+    # How late a 5 ms sleep wakes up is what any other update would wait
+    lags = []
+
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - started - TICK)
+
+    return lags
+
+
+async def inline(link: str):
+    return qr.render_invite_qr(link)
+
+
+async def run(render, teachers: int):
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(measure_lag(stop))
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            render(f"https://t.me/MyClassScheduleBot?start={index:032d}")
+            for index in range(teachers)
+        )
+    )
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    lags = await ticker
+
+    print(
+        f"{render.__name__:<18} {teachers} QR codes in {elapsed * 1000:>7.1f} ms"
+        f"  loop lag p50 {common.percentile(lags, 50) * 1000:>6.2f} ms"
+        f"  max {max(lags) * 1000:>7.2f} ms"
+    )
+
+
+async def main(teachers: int):
+    # Start the workers before measuring, as a running bot would have them
+    await utils.render_invite_qr("warm-up")
+
+    await run(inline, teachers)
+    await run(utils.render_invite_qr, teachers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--teachers", type=int, default=8)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.teachers))
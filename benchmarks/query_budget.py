@@ -0,0 +1,308 @@
+"""
+Drives every handler in main.py once against a seeded database and checks
+how many SQL statements it ran against the budget below. Exits with 1 when
+a handler goes over, so it can fail a build:
+
+    python benchmarks/query_budget.py
+
+Caches in repository are cleared before each measured update, the counts
+are for the cold path. Buffered FSM writes are flushed inside the
+measurement. Lower a budget when a change makes a handler cheaper.
+"""
+
+import sys
+import asyncio
+import argparse
+from itertools import count
+
+import common
+
+import main
+import metrics
+import utils
+import keyboards
+import repository
+from Models.models import ClassRooms
+
+NEW_USERS = count(3_000_000)
+
+NUMBER, LETTER = 1, "А"
+
+
+def teacher(text: str):
+    return common.message_update(common.TEACHER_ID, text)
+
+
+def teacher_callback(data):
+    return common.callback_update(common.TEACHER_ID, data.pack())
+
+
+def pupil(text: str):
+    return common.message_update(common.PUPIL_ID_OFFSET, text)
+
+
+def classroom_id() -> int:
+    return ClassRooms.objects.get(Number=NUMBER, Letter=LETTER).pk
+
+
+def start_with_invite():
+    identifier = ClassRooms.objects.get(
+        Number=NUMBER, Letter=LETTER
+    ).ClassRoomIdentifier
+    user = next(NEW_USERS)
+
+    return [], common.message_update(user, f"/start {identifier}")
+
+
+def sign_up():
+    _, start = start_with_invite()
+    user = start.message.from_user.id
+
+    return [start], common.message_update(user, "Иванов Иван")
+
+
+def create_classroom():
+    return [
+        teacher_callback(keyboards.ClassRoomsActionsCallback(action="create")),
+        teacher("11"),
+    ], teacher("Ю")
+
+
+def edit_schedule():
+    return [
+        teacher_callback(
+            keyboards.EditScheduleCallback(classroom_id=classroom_id(), day=2)
+        )
+    ], teacher("Алгебра\nГеометрия\nФизика\nХимия\nИстория\nБиология")
+
+
+def resubmit_schedule():
+    setup, save = edit_schedule()
+
+    return [*setup, save], teacher(save.message.text)
+
+
+def import_schedule():
+    # The week of the measured class as a teacher's CSV
+    lines = ["Класс;День;Урок;Предмет"] + [
+        f"{NUMBER}{LETTER};{day_name};{order};{subject}"
+        for day_name in utils.DAYS_OF_WEEK[:5]
+        for order, subject in enumerate(common.SUBJECTS[:6], start=1)
+    ]
+    content = "\n".join(lines).encode("utf-8-sig")
+    main.bot.session.files["schedule.csv"] = content
+
+    return [], common.document_update(
+        common.TEACHER_ID, "schedule.csv", "schedule.csv", len(content)
+    )
+
+
+# name, SQL statements allowed, scenario
+BUDGETS = [
+    ("start: known user", 2, lambda: ([], pupil("/start"))),
+    ("start: invite link", 5, start_with_invite),
+    ("sign up: full name", 7, sign_up),
+    (
+        "add_admin",
+        7,
+        lambda: (
+            [],
+            common.message_update(
+                int(common.os.environ["ROOT_ADMIN"]),
+                f"/add_admin {next(NEW_USERS)} Петров Пётр",
+            ),
+        ),
+    ),
+    ("pupil: my schedule", 1, lambda: ([], pupil("Моё расписание 📝"))),
+    (
+        "pupil: schedule day",
+        2,
+        lambda: (
+            [],
+            common.callback_update(
+                common.PUPIL_ID_OFFSET,
+                keyboards.ScheduleDayCallback(day=1).pack(),
+            ),
+        ),
+    ),
+    (
+        "pupil: whole week",
+        2,
+        lambda: (
+            [],
+            common.callback_update(
+                common.PUPIL_ID_OFFSET,
+                keyboards.WeekScheduleCallback().pack(),
+            ),
+        ),
+    ),
+    ("teacher: classes menu", 2, lambda: ([], teacher("Класс 📖"))),
+    ("teacher: schedule menu", 2, lambda: ([], teacher("Расписание 📝"))),
+    (
+        "teacher: all parallels",
+        2,
+        lambda: (
+            [],
+            teacher_callback(
+                keyboards.ClassRoomsActionsCallback(action="view_all")
+            ),
+        ),
+    ),
+    (
+        "teacher: classes of parallel",
+        2,
+        lambda: (
+            [],
+            teacher_callback(
+                keyboards.ViewClassRoomsCallback(
+                    class_number=NUMBER, purpose="view_classrooms"
+                )
+            ),
+        ),
+    ),
+    (
+        "teacher: class information",
+        3,
+        lambda: (
+            [],
+            teacher_callback(
+                keyboards.ViewClassRoomCallback(
+                    classroom_id=classroom_id(),
+                    purpose="view_classrooms",
+                )
+            ),
+        ),
+    ),
+    (
+        "teacher: class week",
+        2,
+        lambda: (
+            [],
+            teacher_callback(
+                keyboards.ViewClassRoomCallback(
+                    classroom_id=classroom_id(),
+                    purpose="view_schedule",
+                )
+            ),
+        ),
+    ),
+    (
+        "teacher: class day",
+        3,
+        lambda: (
+            [],
+            teacher_callback(
+                keyboards.ClassRoomScheduleForWeekAdminCallback(
+                    classroom_id=classroom_id(), day=1
+                )
+            ),
+        ),
+    ),
+    (
+        "teacher: class whole week",
+        3,
+        lambda: (
+            [],
+            teacher_callback(
+                keyboards.WeekScheduleCallback(classroom_id=classroom_id())
+            ),
+        ),
+    ),
+    (
+        "teacher: open day editor",
+        5,
+        lambda: (
+            [],
+            teacher_callback(
+                keyboards.EditScheduleCallback(
+                    classroom_id=classroom_id(), day=1
+                )
+            ),
+        ),
+    ),
+    (
+        "teacher: class week, old",
+        3,
+        lambda: (
+            [],
+            teacher_callback(
+                keyboards.LegacyViewClassRoomCallback(
+                    class_number=NUMBER,
+                    class_letter=LETTER,
+                    purpose="view_schedule",
+                )
+            ),
+        ),
+    ),
+    ("teacher: save day", 10, edit_schedule),
+    ("teacher: save unchanged day", 4, resubmit_schedule),
+    ("teacher: create class", 5, create_classroom),
+    (
+        "teacher: invite QR",
+        3,
+        lambda: (
+            [],
+            teacher_callback(
+                keyboards.ClassRoomActionCallback(
+                    action="generate_qr_code",
+                    classroom_id=classroom_id(),
+                )
+            ),
+        ),
+    ),
+    ("teacher: import schedule", 8, import_schedule),
+    ("teacher: export CSV", 3, lambda: ([], teacher("/export"))),
+    ("teacher: export JSON", 4, lambda: ([], teacher("/export json"))),
+]
+
+
+def clear_caches():
+    repository.identity_cache.clear()
+    repository.schedule_cache.clear()
+    repository.classroom_lists_cache.clear()
+
+
+async def run(verbose: bool) -> int:
+    main.bot = common.make_bot()
+    main.dp.include_router(main.router)
+
+    failures = 0
+
+    for name, budget, scenario in BUDGETS:
+        setup, update = await asyncio.to_thread(scenario)
+
+        for step in setup:
+            await main.dp.feed_update(main.bot, step)
+
+        # close() also cancels a pending delayed flush, so the writes of
+        # the measured update are flushed inside the measurement
+        await main.dp.storage.close()
+        clear_caches()
+
+        with metrics.count_queries() as stats:
+            await main.dp.feed_update(main.bot, update)
+            await main.dp.storage.close()
+
+        failed = stats.count > budget
+        failures += failed
+
+        if failed or verbose:
+            print(
+                f"{'FAIL' if failed else 'ok':<4} {name:<30} "
+                f"{stats.count:>3} / {budget} queries"
+            )
+
+    print(f"{len(BUDGETS) - failures} of {len(BUDGETS)} within budget")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--verbose", "-v", action="store_true")
+    args = parser.parse_args()
+
+    common.migrate()
+    common.seed(classrooms=20, pupils_per_classroom=30)
+
+    sys.exit(asyncio.run(run(args.verbose)))
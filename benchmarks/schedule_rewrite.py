@@ -0,0 +1,97 @@
+"""
+Query count and latency of rewriting one 10-lesson day, compared with the
+old delete + create-per-line + re-read approach.
+
+    python benchmarks/schedule_rewrite.py --repeat 200
+"""
+
+import time
+import argparse
+import statistics
+
+import common
+
+from asgiref.sync import async_to_sync
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+
+import repository
+from Models.models import ClassRooms, ScheduleDays, Lessons
+
+LESSONS = 10
+
+
+def old_rewrite(ClassRoom, day, lesson_names):
+
+    ScheduleDay = ClassRoom.ScheduleDays.filter(DayOfWeek=day)
+    if not ScheduleDay.exists():
+        ScheduleDay = ScheduleDays.objects.create(
+            Classroom=ClassRoom, DayOfWeek=day
+        )
+    else:
+        ScheduleDay = ScheduleDay.first()
+
+    ScheduleDay.Lessons.all().delete()
+
+    for index, lesson_name in enumerate(lesson_names):
+        Lessons.objects.create(
+            ScheduleDay=ScheduleDay, Order=index + 1, SubjectName=lesson_name
+        )
+
+    return list(ScheduleDay.Lessons.all())
+
+
+def new_rewrite(ClassRoom, day, lesson_names):
+    return async_to_sync(repository.replace_lessons)(
+        ClassRoom, day, lesson_names
+    )
+
+
+def scenarios():
+    subjects = [
+        common.SUBJECTS[i % len(common.SUBJECTS)] for i in range(LESSONS)
+    ]
+    one_changed = subjects[:2] + ["Биология"] + subjects[3:]
+
+    return {
+        "identical resubmit": (subjects, subjects),
+        "one lesson changed": (subjects, one_changed),
+        "all lessons changed": (subjects, [s + " (у)" for s in subjects]),
+    }
+
+
+def measure(rewrite, ClassRoom, before, after, repeat):
+    queries = []
+    latencies = []
+
+    for _ in range(repeat):
+        rewrite(ClassRoom, 1, before)
+        reset_queries()
+
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            rewrite(ClassRoom, 1, after)
+            latencies.append(time.perf_counter() - started)
+
+        queries.append(len(captured.captured_queries))
+
+    return max(queries), statistics.median(latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    common.migrate()
+    ClassRoom = ClassRooms.objects.create(Number="5", Letter="А")
+
+    for name, (before, after) in scenarios().items():
+        for label, rewrite in (("old", old_rewrite), ("new", new_rewrite)):
+            query_count, latency = measure(
+                rewrite, ClassRoom, before, after, args.repeat
+            )
+            print(
+                f"{name:<22} {label}  {query_count:>3} queries  "
+                f"{latency * 1000:>7.2f} ms"
+            )
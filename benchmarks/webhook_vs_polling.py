@@ -0,0 +1,92 @@
+"""
+End-to-end latency of one update in polling and in webhook mode, measured
+against benchmarks/fake_telegram.py on localhost: from the moment the stub has
+the update to the moment it receives the bot's sendMessage reply.
+
+    python benchmarks/webhook_vs_polling.py --updates 300
+"""
+
+import json
+import time
+import asyncio
+import argparse
+
+import common
+
+from aiohttp import ClientSession, web
+
+import main
+from fake_telegram import FakeTelegram
+
+STUB_PORT = 18081
+WEBHOOK_PORT = 18082
+
+
+async def run(mode: str, updates: int):
+    stub = FakeTelegram()
+    stub_runner = await stub.start(port=STUB_PORT)
+
+    main.TELEGRAM_API_URL = f"http://127.0.0.1:{STUB_PORT}"
+    bot = main.bot = main.create_bot()
+
+    if mode == "polling":
+        deliver_task = asyncio.create_task(
+            main.dp.start_polling(bot, handle_signals=False)
+        )
+    else:
+        webhook_runner = web.AppRunner(main.create_webhook_app(bot))
+        await webhook_runner.setup()
+        await web.TCPSite(webhook_runner, "127.0.0.1", WEBHOOK_PORT).start()
+
+    latencies = []
+
+    async with ClientSession() as http:
+        await asyncio.sleep(0.5)
+        started_all = time.perf_counter()
+
+        for index in range(updates):
+            pupil = common.PUPIL_ID_OFFSET + index % 100
+            update = common.message_update(pupil, "Моё расписание 📝")
+            reply = stub.expect("sendMessage", pupil)
+            payload = json.loads(update.model_dump_json(exclude_none=True))
+
+            started = time.perf_counter()
+
+            if mode == "polling":
+                stub.push_update(payload)
+            else:
+                await http.post(
+                    f"http://127.0.0.1:{WEBHOOK_PORT}{main.WEBHOOK_PATH}",
+                    json=payload,
+                    headers={
+                        "X-Telegram-Bot-Api-Secret-Token": main.WEBHOOK_SECRET
+                    },
+                )
+
+            latencies.append(await reply - started)
+
+        elapsed = time.perf_counter() - started_all
+
+    if mode == "polling":
+        await main.dp.stop_polling()
+        await deliver_task
+    else:
+        await webhook_runner.cleanup()
+
+    await bot.session.close()
+    await stub_runner.cleanup()
+
+    common.report(mode, latencies, elapsed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=300)
+    args = parser.parse_args()
+
+    common.migrate()
+    common.seed(classrooms=5, pupils_per_classroom=20)
+    main.dp.include_router(main.router)
+
+    asyncio.run(run("polling", args.updates))
+    asyncio.run(run("webhook", args.updates))
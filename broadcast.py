@@ -0,0 +1,165 @@
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Iterable, Union
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+)
+
+logger = logging.getLogger(__name__)
+
+# Telegram allows roughly 30 messages per second for the whole bot and
+# one message per second for every single chat
+GLOBAL_RATE = 25
+PER_CHAT_RATE = 1
+CONCURRENCY = 10
+MAX_ATTEMPTS = 3
+
+
+class TokenBucket:
+
+    def __init__(self, rate: float, capacity: Union[float, None] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    @property
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+    async def acquire(self):
+
+        async with self._lock:
+            self._refill()
+
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+
+            self.tokens -= 1
+
+
+@dataclass
+class BroadcastResult:
+    delivered: int = 0
+    failed: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.delivered + self.failed
+
+
+class Broadcaster:
+    """
+    Sends one message to many chats with bounded concurrency while staying
+    under Telegram's global and per-chat limits.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = CONCURRENCY,
+        rate: float = GLOBAL_RATE,
+        per_chat_rate: float = PER_CHAT_RATE,
+    ):
+        self.concurrency = concurrency
+        self.per_chat_rate = per_chat_rate
+        # No burst allowance: a full bucket on top of the refill would let
+        # almost twice the rate through in the first second
+        self.bucket = TokenBucket(rate, 1)
+        self._chat_buckets: dict[int, TokenBucket] = {}
+        self._resume_at = 0.0
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+
+        if len(self._chat_buckets) > 10_000:
+            self._chat_buckets = {
+                key: bucket
+                for key, bucket in self._chat_buckets.items()
+                if not bucket.is_full
+            }
+
+        if chat_id not in self._chat_buckets:
+            self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, 1)
+
+        return self._chat_buckets[chat_id]
+
+    async def _wait_for_flood_control(self):
+
+        while (delay := self._resume_at - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+
+    async def send_one(
+        self, bot: Bot, chat_id: int, text: str, **kwargs
+    ) -> bool:
+
+        for _ in range(MAX_ATTEMPTS):
+
+            await self._wait_for_flood_control()
+            await self._chat_bucket(chat_id).acquire()
+            await self.bucket.acquire()
+
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                return True
+
+            except TelegramRetryAfter as error:
+                # Flood control is bot-wide, so every worker has to wait
+                self._resume_at = max(
+                    self._resume_at, time.monotonic() + error.retry_after
+                )
+
+            except TelegramNetworkError:
+                await asyncio.sleep(1)
+
+            except TelegramAPIError as error:
+                # Blocked bot, deleted account, bad request: retrying won't help
+                logger.info(
+                    "Message to %s was not delivered: %s", chat_id, error
+                )
+                return False
+
+        logger.warning(
+            "Message to %s was not delivered after retries", chat_id
+        )
+        return False
+
+    async def send(
+        self, bot: Bot, chat_ids: Iterable[int], text: str, **kwargs
+    ) -> BroadcastResult:
+
+        result = BroadcastResult()
+        queue = asyncio.Queue()
+
+        for chat_id in chat_ids:
+            queue.put_nowait(chat_id)
+
+        async def worker():
+
+            while not queue.empty():
+                chat_id = queue.get_nowait()
+
+                if await self.send_one(bot, chat_id, text, **kwargs):
+                    result.delivered += 1
+                else:
+                    result.failed += 1
+
+        await asyncio.gather(
+            *(worker() for _ in range(min(self.concurrency, queue.qsize())))
+        )
+
+        return result
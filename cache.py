@@ -0,0 +1,100 @@
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Union
+
+MISSING = object()
+
+
+class LRUCache:
+    """
+    Small in-process LRU cache with an optional time-to-live per entry.
+    `get` returns MISSING (not None) on a miss, so None can be cached too.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: Union[float, None] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._loading: dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Any:
+
+        if (entry := self._data.get(key, MISSING)) is MISSING:
+            self.misses += 1
+            return MISSING
+
+        value, expires_at = entry
+
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return MISSING
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any):
+
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    async def get_or_load(
+        self, key: Hashable, loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Returns the cached value or awaits `loader` for it. Concurrent misses
+        for the same key share a single `loader` call.
+        """
+
+        if (value := self.get(key)) is not MISSING:
+            return value
+
+        if future := self._loading.get(key):
+            return await asyncio.shield(future)
+
+        future = self._loading[key] = (
+            asyncio.get_running_loop().create_future()
+        )
+
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as error:
+            future.set_exception(error)
+            # Nobody else may be waiting, don't warn about it
+            future.exception()
+            raise
+        else:
+            # Invalidated while loading: hand the value out but don't keep it
+            if self._loading.get(key) is future:
+                self.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            if self._loading.get(key) is future:
+                del self._loading[key]
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+        self._loading.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+        self._loading.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+from datetime import date, datetime, time, timedelta, tzinfo
+
+import utils
+import repository
+from outbox import OutboxDispatcher
+
+logger = logging.getLogger(__name__)
+
+
+class DigestScheduler:
+    """
+    Every day at `at` sends each pupil today's schedule of their class.
+    The text is rendered once per class and goes through the outbox, so
+    the usual rate limits apply; classes are enqueued one by one over
+    `window` seconds so the first minutes of the morning don't get all of
+    it at once.
+    """
+
+    def __init__(
+        self,
+        outbox_dispatcher: OutboxDispatcher,
+        at: time,
+        window: float,
+        tz: tzinfo,
+    ):
+        self.outbox_dispatcher = outbox_dispatcher
+        self.at = at
+        self.window = window
+        self.tz = tz
+
+    def _next_run(self, now: datetime) -> datetime:
+        """
+        Today's run if it's not over yet (a restart in the middle of the
+        window picks it up again), otherwise tomorrow's.
+        """
+
+        run_at = datetime.combine(now.date(), self.at, tzinfo=self.tz)
+
+        if now > run_at + timedelta(seconds=self.window):
+            run_at += timedelta(days=1)
+
+        return run_at
+
+    async def send(self, day: date) -> int:
+        """
+        Enqueues the digest for `day`, returns the number of messages. The
+        batch key contains the date, a second call for the same day adds
+        nothing.
+        """
+
+        digests = await repository.get_day_digests(day.isoweekday())
+        delay = self.window / len(digests) if digests else 0
+        total = 0
+
+        for ClassRoom_id, lessons_text, telegram_ids in digests:
+
+            await repository.aenqueue_notifications(
+                telegram_ids,
+                f"☀️ Доброе утро! Твое расписание на *{utils.DAYS_OF_WEEK[day.weekday()]}*:\n\n{lessons_text}",
+                parse_mode="Markdown",
+                batch=f"digest:{day.isoformat()}:{ClassRoom_id}",
+            )
+            self.outbox_dispatcher.notify()
+            total += len(telegram_ids)
+
+            await asyncio.sleep(delay)
+
+        return total
+
+    async def run(self):
+
+        while True:
+            run_at = self._next_run(datetime.now(self.tz))
+            await asyncio.sleep(
+                max(0, (run_at - datetime.now(self.tz)).total_seconds())
+            )
+
+            try:
+                sent = await self.send(run_at.date())
+                logger.info("Morning digest: %s messages enqueued", sent)
+            except Exception:
+                logger.exception("Morning digest failed")
+
+            # Past the window, _next_run moves on to tomorrow
+            await asyncio.sleep(
+                max(
+                    0,
+                    (
+                        run_at
+                        + timedelta(seconds=self.window + 1)
+                        - datetime.now(self.tz)
+                    ).total_seconds(),
+                )
+            )
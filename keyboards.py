@@ -12,17 +12,20 @@ class ViewClassRoomsCallback(CallbackData, prefix="ViewClassRooms"):
     purpose: str  # view_classrooms/view_schedule
 
 
-class ViewClassRoomCallback(CallbackData, prefix="ViewClassRoom"):
-    class_number: int
-    class_letter: str
+# Callbacks of a single class carry its pk under a short prefix, so a
+# handler fetches the class by primary key and the payload stays far below
+# Telegram's 64 bytes. The Legacy* classes below parse buttons sent before.
+
+
+class ViewClassRoomCallback(CallbackData, prefix="vc"):
+    classroom_id: int  # 0 for the back button
     purpose: str  # view_classrooms/view_schedule
     is_back: bool = False
 
 
-class ClassRoomActionCallback(CallbackData, prefix="ClassRoomAction"):
+class ClassRoomActionCallback(CallbackData, prefix="ca"):
     action: str  # generate_qr_code/edit/delete/back and сonfirm_delete/cancel_delete
-    class_number: int
-    class_letter: str
+    classroom_id: int
 
 
 class ScheduleDayCallback(CallbackData, prefix="ScheduleDay"):
@@ -30,7 +33,42 @@ class ScheduleDayCallback(CallbackData, prefix="ScheduleDay"):
     is_back: bool = False
 
 
-class ClassRoomScheduleForWeekAdminCallback(
+class WeekScheduleCallback(CallbackData, prefix="ws"):
+    # Pupils leave the class empty and get their own
+    classroom_id: int = 0
+
+
+class ClassRoomScheduleForWeekAdminCallback(CallbackData, prefix="cd"):
+    classroom_id: int
+    day: int = 0
+    is_back: bool = False
+
+
+class EditScheduleCallback(CallbackData, prefix="es"):
+    classroom_id: int
+    day: int = 0
+    is_back: bool = False
+
+
+class LegacyViewClassRoomCallback(CallbackData, prefix="ViewClassRoom"):
+    class_number: int
+    class_letter: str
+    purpose: str
+    is_back: bool = False
+
+
+class LegacyClassRoomActionCallback(CallbackData, prefix="ClassRoomAction"):
+    action: str
+    class_number: int
+    class_letter: str
+
+
+class LegacyWeekScheduleCallback(CallbackData, prefix="WeekSchedule"):
+    class_number: int = 0
+    class_letter: str = ""
+
+
+class LegacyClassRoomScheduleForWeekAdminCallback(
     CallbackData, prefix="ClassRoomScheduleForWeekAdmin"
 ):
     class_number: int
@@ -39,13 +77,25 @@ class ClassRoomScheduleForWeekAdminCallback(
     is_back: bool = False
 
 
-class EditScheduleCallback(CallbackData, prefix="EditSchedule"):
+class LegacyEditScheduleCallback(CallbackData, prefix="EditSchedule"):
     class_number: int
     class_letter: str
     day: int = 0
     is_back: bool = False
 
 
+# Old-format callback -> the one it is answered as
+LEGACY_CALLBACKS = {
+    LegacyViewClassRoomCallback: ViewClassRoomCallback,
+    LegacyClassRoomActionCallback: ClassRoomActionCallback,
+    LegacyWeekScheduleCallback: WeekScheduleCallback,
+    LegacyClassRoomScheduleForWeekAdminCallback: (
+        ClassRoomScheduleForWeekAdminCallback
+    ),
+    LegacyEditScheduleCallback: EditScheduleCallback,
+}
+
+
 builder = ReplyKeyboardBuilder()
 
 builder.row(
@@ -98,6 +148,12 @@ for day, day_name in enumerate(
         )
     )
 
+builder.row(
+    InlineKeyboardButton(
+        text="Вся неделя", callback_data=WeekScheduleCallback().pack()
+    )
+)
+
 schedule_days_keyboard = builder.as_markup(resize_keyboard=True)
 
 
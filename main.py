@@ -1,28 +1,39 @@
 import os
 import sys
 import time
+import secrets
 import logging
 from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
 import django
 import asyncio
 from io import BytesIO
+from typing import Union
 
 from dotenv import load_dotenv
+from aiohttp import web
 from aiogram import Bot, Dispatcher, F, Router, types
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import CommandStart, Command, CommandObject
 from aiogram.types import Message, CallbackQuery, LinkPreviewOptions
 from aiogram.utils.markdown import hbold
 from aiogram.utils.deep_linking import create_start_link
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import SimpleEventIsolation
 from aiogram.fsm.state import State, StatesGroup
+from aiogram.webhook.aiohttp_server import (
+    SimpleRequestHandler,
+    setup_application,
+)
 
 os.environ.setdefault(
     "DJANGO_SETTINGS_MODULE", "MyClassScheduleWebsite.settings"
 )
-os.environ["DJANGO_ALLOW_ASYNC_UNSAFE"] = "true"
 django.setup()
 
 # Load environment variables
@@ -30,6 +41,16 @@ load_dotenv()
 
 # Import Django ORM models
 from Models.models import Users, ClassRooms, ScheduleDays, Lessons
+import repository
+import schedule_import
+import schedule_export
+import broadcast
+import outbox
+import digest
+import metrics
+import middlewares
+import storage
+import supervisor
 import utils
 import states
 import keyboards
@@ -49,16 +70,115 @@ except KeyError:
 except ValueError:
     raise ValueError("ROOT_ADMIN must be a valid integer")
 
+# Bot API server, e.g. a local telegram-bot-api or benchmarks/fake_telegram.py
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+
+# "polling" (default) or "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+if BOT_MODE not in ("polling", "webhook"):
+    raise ValueError("BOT_MODE must be either polling or webhook")
+
+# Public https address Telegram delivers updates to, e.g. https://example.com
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+if BOT_MODE == "webhook" and not WEBHOOK_URL:
+    raise ValueError("WEBHOOK_URL must be set when BOT_MODE is webhook")
+
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8080))
+# Telegram sends it back in every request, anything without it is rejected
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+
+# Prometheus endpoint, off unless a port is set. Worker N of a supervisor
+# listens on METRICS_PORT + N
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+
+# Morning digest of today's schedule, off unless a time ("07:30") is set.
+# Classes are enqueued one by one over DIGEST_WINDOW minutes
+DIGEST_TIME = os.getenv("DIGEST_TIME")
+DIGEST_WINDOW = float(os.getenv("DIGEST_WINDOW", 15))
+DIGEST_TIMEZONE = os.getenv("DIGEST_TIMEZONE", "Europe/Moscow")
+
+# More than one runs a supervisor that shards updates between processes
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", 1))
+
 
 # Initialize Dispatcher and Router
 logging.basicConfig(level=logging.INFO)
-dp = Dispatcher()
+# Event isolation handles one user's updates strictly one after another
+dp = Dispatcher(
+    storage=storage.DjangoStorage(), events_isolation=SimpleEventIsolation()
+)
+dp.update.outer_middleware(metrics.UpdateMetricsMiddleware())
+dp.update.outer_middleware(middlewares.DatabaseConnectionMiddleware())
+dp.update.outer_middleware(middlewares.IdentityMiddleware())
 router = Router()
+router.message.middleware(metrics.HandlerMetricsMiddleware())
+router.callback_query.middleware(metrics.HandlerMetricsMiddleware())
+broadcaster = broadcast.Broadcaster()
+outbox_dispatcher = outbox.OutboxDispatcher(broadcaster)
+digest_scheduler = (
+    digest.DigestScheduler(
+        outbox_dispatcher,
+        at=datetime.strptime(DIGEST_TIME, "%H:%M").time(),
+        window=DIGEST_WINDOW * 60,
+        tz=ZoneInfo(DIGEST_TIMEZONE),
+    )
+    if DIGEST_TIME
+    else None
+)
+
+
+async def send_invite_qr(chat_id: int, ClassRoom: ClassRooms) -> None:
+    """
+    Sends the invite QR code of a class. After the first upload Telegram's
+    file_id is reused, so resending costs neither rendering nor upload.
+    """
+
+    if ClassRoom.InviteQRFileId:
+        try:
+            await bot.send_photo(
+                chat_id=chat_id,
+                photo=ClassRoom.InviteQRFileId,
+                caption="Подключайся к Моему Расписанию!",
+            )
+            return
+        except TelegramBadRequest:
+            # file_id belongs to another bot or has expired, upload again
+            pass
+
+    link = await create_start_link(bot, f"{ClassRoom.ClassRoomIdentifier}")
+
+    try:
+        photo = await utils.generate_invite_qr(
+            ClassRoom.ClassRoomIdentifier, link
+        )
+    except asyncio.TimeoutError:
+        await bot.send_message(
+            chat_id=chat_id,
+            text="Не получилось сгенерировать QR-код, попробуйте еще раз чуть позже",
+        )
+        return
+
+    sent_message = await bot.send_photo(
+        chat_id=chat_id,
+        photo=photo,
+        caption="Подключайся к Моему Расписанию!",
+    )
+
+    if sent_message.photo:
+        await repository.set_invite_qr_file_id(
+            ClassRoom, sent_message.photo[-1].file_id
+        )
 
 
 @router.message(CommandStart())
 async def command_start_handler(
-    message: types.Message, command: CommandObject, state: FSMContext
+    message: types.Message,
+    command: CommandObject,
+    state: FSMContext,
+    identity: Union[repository.Identity, None],
 ) -> None:
     args = command.args
 
@@ -66,23 +186,21 @@ async def command_start_handler(
 Я твой помощник с расписанием. Буду держать тебя в курсе, что, где и когда! Заглядывай сюда, чтобы всё знать первым. 🚀"""
     keyboard = None
 
-    if Users.objects.filter(TelegramId=message.from_user.id).exists():
+    if identity:
 
-        User = Users.objects.get(TelegramId=message.from_user.id)
-
-        if User.UserType == Users.UserTypeChoices.PUPIL:
+        if identity.is_pupil:
 
             answer = "Привет! 👋 Смотри свое расписание"
             keyboard = keyboards.pupil_keyboard
 
-        elif User.UserType == Users.UserTypeChoices.TEACHER:
+        elif identity.is_teacher:
 
             keyboard = keyboards.teacher_keyboard
 
     elif (
         args
         and len(args) == 32
-        and ClassRooms.objects.filter(ClassRoomIdentifier=args).exists()
+        and await repository.classroom_exists_by_identifier(args)
     ):
 
         answer = "Привет! 👋\nЯ твой помощник с расписанием. Буду держать тебя в курсе, что, где и когда!\n\nПожалуйста, введите вашу Фамилию и Имя."
@@ -106,20 +224,15 @@ async def sign_up_pupil_handler(
 
         data = await state.get_data()
 
-        ClassRoom = ClassRooms.objects.filter(
-            ClassRoomIdentifier=data["ClassRoomIdentifier"]
-        )
-
-        if not ClassRoom.exists():
+        if not (
+            ClassRoom := await repository.get_classroom_by_identifier(
+                data["ClassRoomIdentifier"]
+            )
+        ):
             return
 
-        ClassRoom = ClassRoom.first()
-
-        Users.objects.create(
-            TelegramId=message.from_user.id,
-            Fullname=data["Fullname"],
-            ClassRoom=ClassRoom,
-            UserType=Users.UserTypeChoices.PUPIL,
+        await repository.create_pupil(
+            message.from_user.id, data["Fullname"], ClassRoom
         )
 
         await state.clear()
@@ -149,10 +262,8 @@ async def command_add_admin_handler(message: types.Message) -> None:
     args = message.text.split()[1:]
     if len(args) == 3 and args[0].isdigit():
 
-        User = Users.objects.create(
-            TelegramId=int(args[0]),
-            Fullname=f"{args[1]} {args[2]}",
-            UserType=Users.UserTypeChoices.TEACHER,
+        User = await repository.create_teacher(
+            int(args[0]), f"{args[1]} {args[2]}"
         )
 
         await message.answer(
@@ -164,17 +275,34 @@ async def command_add_admin_handler(message: types.Message) -> None:
         )
 
 
+@router.message(Command("export"))
+async def handle_export(
+    message: Message,
+    command: CommandObject,
+    identity: Union[repository.Identity, None],
+):
+
+    if not identity or not identity.is_teacher:
+        return
+
+    if (command.args or "").strip().lower() == "json":
+        names = ["school.json"]
+    else:
+        names = ["schedule.csv", "pupils.csv"]
+
+    # Each file is uploaded while it is read from the database
+    for name in names:
+        await message.answer_document(schedule_export.ExportFile(name))
+
+
 @router.message(F.text == "Моё расписание 📝")
-async def handle_classrooms(message: Message):
+async def handle_classrooms(
+    message: Message, identity: Union[repository.Identity, None]
+):
 
     await message.delete()
 
-    if not (
-        User := Users.objects.filter(
-            TelegramId=message.from_user.id,
-            UserType=Users.UserTypeChoices.PUPIL,
-        )
-    ).exists():
+    if not identity or not identity.is_pupil:
         return
 
     days = [
@@ -203,13 +331,10 @@ async def handle_schedule_days(
     query: CallbackQuery,
     callback_data: keyboards.ScheduleDayCallback,
     state: FSMContext,
+    identity: Union[repository.Identity, None],
 ):
 
-    if not (
-        User := Users.objects.filter(
-            TelegramId=query.from_user.id, UserType=Users.UserTypeChoices.PUPIL
-        )
-    ).exists():
+    if not identity or not identity.is_pupil:
         return
 
     days = [
@@ -236,26 +361,16 @@ async def handle_schedule_days(
         )
         return
 
-    ClassRoom = User.first().ClassRoom
-
     if not (
-        ScheduleDay := ClassRoom.ScheduleDays.filter(
-            DayOfWeek=callback_data.day
+        lessons_answer := await repository.get_schedule_text(
+            identity.ClassRoom_id, callback_data.day
         )
-    ).exists():
+    ):
         await query.message.answer(
             "Твой учитель еще не добавил расписания на этот день😓"
         )
         return
 
-    ScheduleDay = ScheduleDay.first()
-
-    text_lines = []
-    for lesson in ScheduleDay.Lessons.all():
-        text_lines.append(f"{lesson.Order}. {lesson.SubjectName}")
-
-    lessons_answer = "\n".join(text_lines)
-
     await query.message.delete()
 
     await query.message.answer(
@@ -265,14 +380,90 @@ async def handle_schedule_days(
     )
 
 
+async def upgrade_legacy_callback(query: CallbackQuery, callback_data) -> dict:
+    """
+    Filter after a keyboards.Legacy* one: answers a button sent before
+    callbacks carried the class pk as the current callback. A class that
+    no longer exists gets pk 0, which no handler finds.
+    """
+
+    ClassRoom_id = 0
+
+    if callback_data.class_number and (
+        ClassRoom := await repository.get_classroom(
+            callback_data.class_number, callback_data.class_letter
+        )
+    ):
+        ClassRoom_id = ClassRoom.pk
+
+    return {
+        "callback_data": keyboards.LEGACY_CALLBACKS[type(callback_data)](
+            classroom_id=ClassRoom_id,
+            **callback_data.model_dump(
+                exclude={"class_number", "class_letter"}
+            ),
+        )
+    }
+
+
+@router.callback_query(keyboards.WeekScheduleCallback.filter())
+@router.callback_query(
+    keyboards.LegacyWeekScheduleCallback.filter(), upgrade_legacy_callback
+)
+async def handle_week_schedule(
+    query: CallbackQuery,
+    callback_data: keyboards.WeekScheduleCallback,
+    identity: Union[repository.Identity, None],
+):
+
+    if not identity:
+        return
+
+    if callback_data.classroom_id and identity.is_teacher:
+
+        if not (
+            ClassRoom := await repository.get_classroom_by_id(
+                callback_data.classroom_id
+            )
+        ):
+            return
+
+        ClassRoom_id = ClassRoom.pk
+        title = (
+            f'Расписание {ClassRoom.Number} "{ClassRoom.Letter}" на неделю:'
+        )
+        keyboard = utils.generate_back_to_week_schedule(ClassRoom.pk)
+
+    elif identity.is_pupil:
+
+        ClassRoom_id = identity.ClassRoom_id
+        title = "Твое расписание на неделю:"
+        keyboard = keyboards.back_to_schedule_days_keyboard
+
+    else:
+        return
+
+    if not (
+        week_answer := await repository.get_week_schedule_text(ClassRoom_id)
+    ):
+        week_answer = "Расписание на эту неделю еще не добавлено😓"
+
+    # One edit instead of delete + send
+    await query.message.edit_text(
+        f"🗓 {title}\n\n{week_answer}",
+        reply_markup=keyboard,
+        parse_mode="Markdown",
+    )
+
+
 @router.message(F.text == "Класс 📖")
-async def handle_classrooms(message: Message):
+async def handle_classrooms(
+    message: Message, identity: Union[repository.Identity, None]
+):
 
     await message.delete()
 
-    if not Users.objects.filter(
-        TelegramId=message.from_user.id, UserType=Users.UserTypeChoices.TEACHER
-    ).exists():
+    if not identity or not identity.is_teacher:
         return
 
     await message.answer(
@@ -282,18 +473,23 @@ async def handle_classrooms(message: Message):
 
 
 @router.message(F.text == "Расписание 📝")
-async def handle_schedule(message: Message):
+async def handle_schedule(
+    message: Message, identity: Union[repository.Identity, None]
+):
 
     await message.delete()
 
-    if not Users.objects.filter(
-        TelegramId=message.from_user.id, UserType=Users.UserTypeChoices.TEACHER
-    ).exists():
+    if not identity or not identity.is_teacher:
         return
 
-    answer = "Действия с Расписанием 📝"
+    answer = (
+        "Действия с Расписанием 📝\n\n"
+        "Расписание всей школы можно загрузить файлом .csv или .xlsx со "
+        "столбцами: Класс, День, Урок, Предмет\n\n"
+        "Выгрузить расписание и списки учеников: /export (или /export json)"
+    )
     keyboard = utils.generate_classrooms(
-        ClassRooms.objects.all(), purpose="view_schedule"
+        await repository.get_class_numbers(), purpose="view_schedule"
     )
 
     if not keyboard:
@@ -302,6 +498,45 @@ async def handle_schedule(message: Message):
     await message.answer(answer, reply_markup=keyboard)
 
 
+@router.message(F.document)
+async def handle_schedule_import(
+    message: Message, identity: Union[repository.Identity, None]
+):
+
+    if not identity or not identity.is_teacher:
+        return
+
+    # file_size is optional in the Bot API
+    if (message.document.file_size or 0) > schedule_import.MAX_FILE_SIZE:
+        await message.answer("Файл слишком большой, максимум 5 МБ")
+        return
+
+    document = await message.bot.download(message.document, BytesIO())
+
+    try:
+        # Parsing is CPU-bound, keep it off the event loop
+        rows = await asyncio.to_thread(
+            schedule_import.parse, document, message.document.file_name or ""
+        )
+    except schedule_import.ScheduleImportError as error:
+        await message.answer(
+            "Расписание не загружено, исправьте ошибки в файле:\n\n"
+            + "\n".join(error.errors)
+        )
+        return
+
+    summary = await repository.import_schedule(
+        rows, changed_by=message.from_user.id
+    )
+
+    await message.answer(
+        f"Расписание загружено ✅\n\n"
+        f"Классов: {summary.classrooms} (новых: {summary.created_classrooms})\n"
+        f"Дней: {summary.days} (изменилось: {summary.changed_days})\n"
+        f"Уроков: {summary.lessons}"
+    )
+
+
 @router.callback_query(keyboards.ClassRoomsActionsCallback.filter())
 async def handle_classrooms_action(
     query: CallbackQuery,
@@ -315,7 +550,7 @@ async def handle_classrooms_action(
         case "view_all":
             answer = "Выберите параллель:"
             keyboard = utils.generate_classrooms(
-                ClassRooms.objects.all(), purpose="view_classrooms"
+                await repository.get_class_numbers(), purpose="view_classrooms"
             )
             if not keyboard:
                 answer = "Для начала необходимо создать класс"
@@ -372,12 +607,17 @@ async def handle_classroom_letter(message: Message, state: FSMContext):
 
     data = await state.get_data()
 
-    ClassRoom = ClassRooms.objects.create(
-        Number=data["class_number"], Letter=data["class_letter"]
-    )
-
-    link = await create_start_link(bot, f"{ClassRoom.ClassRoomIdentifier}")
-    photo = utils.generate_invite_qr(link)
+    if not (
+        ClassRoom := await repository.create_classroom(
+            data["class_number"], data["class_letter"]
+        )
+    ):
+        await state.clear()
+        await message.answer(
+            f'Класс {data["class_number"]} "{data["class_letter"]}" уже существует',
+            reply_markup=keyboards.teacher_keyboard,
+        )
+        return
 
     await message.answer(
         f'Класс {data["class_number"]} "{data["class_letter"]}" создан!\n\nВы можете пригласить учеников по QR-коду ниже',
@@ -385,11 +625,7 @@ async def handle_classroom_letter(message: Message, state: FSMContext):
     )
     await state.clear()
 
-    await bot.send_photo(
-        chat_id=message.from_user.id,
-        photo=photo,
-        caption="Подключайся к Моему Расписанию!",
-    )
+    await send_invite_qr(message.from_user.id, ClassRoom)
 
 
 @router.callback_query(keyboards.ViewClassRoomsCallback.filter())
@@ -399,7 +635,7 @@ async def handle_view_classrooms(
 
     await query.message.delete()
     keyboard = utils.generate_specific_classrooms(
-        ClassRooms.objects.filter(Number=callback_data.class_number),
+        await repository.get_parallel_classrooms(callback_data.class_number),
         class_number=callback_data.class_number,
         purpose=callback_data.purpose,
     )
@@ -408,6 +644,9 @@ async def handle_view_classrooms(
 
 
 @router.callback_query(keyboards.ViewClassRoomCallback.filter())
+@router.callback_query(
+    keyboards.LegacyViewClassRoomCallback.filter(), upgrade_legacy_callback
+)
 async def handle_view_classroom(
     query: CallbackQuery, callback_data: keyboards.ViewClassRoomCallback
 ):
@@ -416,36 +655,36 @@ async def handle_view_classroom(
 
     if callback_data.is_back:
         keyboard = utils.generate_classrooms(
-            ClassRooms.objects.all(), purpose=callback_data.purpose
+            await repository.get_class_numbers(), purpose=callback_data.purpose
         )
         await query.message.answer(
             "Выберите параллель:", reply_markup=keyboard
         )
         return
 
-    if not ClassRooms.objects.filter(
-        Number=callback_data.class_number, Letter=callback_data.class_letter
-    ).exists():
+    if not (
+        ClassRoom := await repository.get_classroom_by_id(
+            callback_data.classroom_id
+        )
+    ):
         return
 
     answer = None
     keyboard = None
 
-    ClassRoom = ClassRooms.objects.filter(
-        Number=callback_data.class_number, Letter=callback_data.class_letter
-    ).first()
-
     match callback_data.purpose:
 
         case "view_classrooms":
 
-            answer = utils.generate_classroom_information(ClassRoom)
+            answer = utils.generate_classroom_information(
+                ClassRoom, await repository.get_pupil_names(ClassRoom)
+            )
             keyboard = utils.generate_classroom_keyboard(ClassRoom)
 
         case "view_schedule":
 
-            answer = f'🗓 Выберите день для редактирования расписания {callback_data.class_number} "{callback_data.class_letter}"'
-            keyboard = utils.generate_week_schedule_for_admin(ClassRoom)
+            answer = f'🗓 Выберите день для редактирования расписания {ClassRoom.Number} "{ClassRoom.Letter}"'
+            keyboard = utils.generate_week_schedule_for_admin(ClassRoom.pk)
 
     await query.message.answer(
         answer, reply_markup=keyboard, parse_mode="Markdown"
@@ -455,6 +694,10 @@ async def handle_view_classroom(
 @router.callback_query(
     keyboards.ClassRoomScheduleForWeekAdminCallback.filter()
 )
+@router.callback_query(
+    keyboards.LegacyClassRoomScheduleForWeekAdminCallback.filter(),
+    upgrade_legacy_callback,
+)
 async def handle_view_schedule_by_teacher(
     query: CallbackQuery,
     callback_data: keyboards.ClassRoomScheduleForWeekAdminCallback,
@@ -462,58 +705,42 @@ async def handle_view_schedule_by_teacher(
 
     await query.message.delete()
 
+    if not (
+        ClassRoom := await repository.get_classroom_by_id(
+            callback_data.classroom_id
+        )
+    ):
+        return
+
     if callback_data.is_back:
         keyboard = utils.generate_specific_classrooms(
-            ClassRooms.objects.filter(Number=callback_data.class_number),
-            class_number=callback_data.class_number,
+            await repository.get_parallel_classrooms(ClassRoom.Number),
+            class_number=int(ClassRoom.Number),
             purpose="view_schedule",
         )
         await query.message.answer("Выберите класс:", reply_markup=keyboard)
         return
 
-    if not (
-        ClassRoom := ClassRooms.objects.filter(
-            Number=callback_data.class_number,
-            Letter=callback_data.class_letter,
-        )
-    ).exists():
-        return
-
-    ClassRoom = ClassRoom.first()
-
     days_of_week = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница"]
     day_name = days_of_week[callback_data.day - 1]
     keyboard = None
 
-    if (
-        not (
-            ScheduleDay := ClassRoom.ScheduleDays.filter(
-                DayOfWeek=callback_data.day
-            )
-        ).exists()
-        or ScheduleDay.first().Lessons.count() == 0
-    ):
-        answer = f'На {day_name} у {callback_data.class_number} "{callback_data.class_letter}" нет расписания'
+    lessons_answer = await repository.get_schedule_text(
+        ClassRoom.pk, callback_data.day
+    )
+
+    if not lessons_answer:
+        answer = f'На {day_name} у {ClassRoom.Number} "{ClassRoom.Letter}" нет расписания'
         keyboard = utils.generate_edit_classroom_schedule(
-            callback_data.class_number,
-            callback_data.class_letter,
+            ClassRoom.pk,
             callback_data.day,
             "Создать",
         )
 
     else:
-        ScheduleDay = ScheduleDay.first()
-
-        text_lines = []
-        for lesson in ScheduleDay.Lessons.all():
-            text_lines.append(f"{lesson.Order}. {lesson.SubjectName}")
-
-        lessons_answer = "\n".join(text_lines)
-
-        answer = f'Расписание на *{day_name}* у {callback_data.class_number} "{callback_data.class_letter}":\n\n{lessons_answer}'
+        answer = f'Расписание на *{day_name}* у {ClassRoom.Number} "{ClassRoom.Letter}":\n\n{lessons_answer}'
         keyboard = utils.generate_edit_classroom_schedule(
-            callback_data.class_number,
-            callback_data.class_letter,
+            ClassRoom.pk,
             callback_data.day,
             "Редактировать",
         )
@@ -524,6 +751,9 @@ async def handle_view_schedule_by_teacher(
 
 
 @router.callback_query(keyboards.EditScheduleCallback.filter())
+@router.callback_query(
+    keyboards.LegacyEditScheduleCallback.filter(), upgrade_legacy_callback
+)
 async def handle_edit_schedule(
     query: CallbackQuery,
     callback_data: keyboards.EditScheduleCallback,
@@ -533,37 +763,23 @@ async def handle_edit_schedule(
     await query.message.delete()
 
     if not (
-        ClassRoom := ClassRooms.objects.filter(
-            Number=callback_data.class_number,
-            Letter=callback_data.class_letter,
+        ClassRoom := await repository.get_classroom_by_id(
+            callback_data.classroom_id
         )
-    ).exists():
+    ):
         return
 
-    ClassRoom = ClassRoom.first()
-
     if callback_data.is_back:
-        answer = f'🗓 Выберите день для редактирования расписания {callback_data.class_number} "{callback_data.class_letter}"'
-        keyboard = utils.generate_week_schedule_for_admin(ClassRoom)
+        answer = f'🗓 Выберите день для редактирования расписания {ClassRoom.Number} "{ClassRoom.Letter}"'
+        keyboard = utils.generate_week_schedule_for_admin(ClassRoom.pk)
         await query.message.answer(
             answer, reply_markup=keyboard, parse_mode="Markdown"
         )
         return
 
-    if not (
-        ScheduleDay := ClassRoom.ScheduleDays.filter(
-            DayOfWeek=callback_data.day
-        )
-    ).exists():
-        ScheduleDay = ScheduleDays.objects.create(
-            Classroom=ClassRoom, DayOfWeek=callback_data.day
-        )
-    else:
-        ScheduleDay = ScheduleDay.first()
-
-    text_lines = [
-        f"{lesson.SubjectName}" for lesson in ScheduleDay.Lessons.all()
-    ]
+    text_lines = await repository.get_lesson_names(
+        ClassRoom.pk, callback_data.day
+    )
 
     if len(text_lines) > 0:
         lessons_answer = "\n".join(text_lines)
@@ -575,8 +791,7 @@ async def handle_edit_schedule(
 
     await state.set_state(states.ScheduleEditing.schedule)
 
-    await state.update_data(class_number=callback_data.class_number)
-    await state.update_data(class_letter=callback_data.class_letter)
+    await state.update_data(classroom_id=ClassRoom.pk)
     await state.update_data(day=callback_data.day)
 
     await query.message.answer(
@@ -592,95 +807,70 @@ async def handle_schedule_editing(message: Message, state: FSMContext):
 
     state_data = await state.get_data()
 
-    if not (
-        ClassRoom := ClassRooms.objects.filter(
-            Number=state_data["class_number"],
-            Letter=state_data["class_letter"],
-        )
-    ).exists():
-        return
-
-    ClassRoom = ClassRoom.first()
-
-    if not (
-        ScheduleDay := ClassRoom.ScheduleDays.filter(
-            DayOfWeek=state_data["day"]
-        )
-    ).exists():
-        ScheduleDay = ScheduleDays.objects.create(
-            Classroom=ClassRoom, DayOfWeek=state_data["day"]
+    # States saved before the class pk was stored have its number and letter
+    if "classroom_id" in state_data:
+        ClassRoom = await repository.get_classroom_by_id(
+            state_data["classroom_id"]
         )
     else:
-        ScheduleDay = ScheduleDay.first()
-
-    ScheduleDay.Lessons.all().delete()
-
-    for index, lesson_name in enumerate(message.text.split("\n")):
-
-        Lessons.objects.create(
-            ScheduleDay=ScheduleDay, Order=index + 1, SubjectName=lesson_name
+        ClassRoom = await repository.get_classroom(
+            state_data["class_number"], state_data["class_letter"]
         )
 
-    text_lines = []
-    for lesson in ScheduleDay.Lessons.all():
-        text_lines.append(f"{lesson.Order}. {lesson.SubjectName}")
+    if not ClassRoom:
+        return
 
-    lessons_answer = "\n".join(text_lines)
+    lesson_names = message.text.split("\n")
+
+    lessons_answer = "\n".join(
+        f"{index + 1}. {lesson_name}"
+        for index, lesson_name in enumerate(lesson_names)
+    )
 
     days_of_week = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница"]
     day_name = days_of_week[state_data["day"] - 1]
 
-    answer = f'Расписание на *{day_name}* у {state_data["class_number"]} "{state_data["class_letter"]}":\n\n{lessons_answer}'
+    # Pupils get the diff, and nothing at all for an identical resubmit
+    if await repository.replace_lessons(
+        ClassRoom,
+        state_data["day"],
+        lesson_names,
+        notify=True,
+        report_to=message.from_user.id,
+    ):
+        outbox_dispatcher.notify()
+        unchanged = ""
+    else:
+        unchanged = "\n\nРасписание не изменилось, ученики не уведомлены"
+
+    answer = f'Расписание на *{day_name}* у {ClassRoom.Number} "{ClassRoom.Letter}":\n\n{lessons_answer}{unchanged}'
     keyboard = utils.generate_edit_classroom_schedule(
-        state_data["class_number"],
-        state_data["class_letter"],
+        ClassRoom.pk,
         state_data["day"],
         "Редактировать",
     )
 
     await message.answer(answer, reply_markup=keyboard, parse_mode="Markdown")
 
-    text = f"🚨 У тебя обновилось расписание 📢\nТвое новое расписание на *{day_name}*:\n\n{lessons_answer}"
-
-    for Pupil in ClassRoom.Pupils.all():
-
-        try:
-
-            await bot.send_message(
-                chat_id=Pupil.TelegramId, text=text, parse_mode="Markdown"
-            )
-
-        except Exception:
-            ...
-
 
 @router.callback_query(keyboards.ClassRoomActionCallback.filter())
+@router.callback_query(
+    keyboards.LegacyClassRoomActionCallback.filter(), upgrade_legacy_callback
+)
 async def handle_view_classroom(
     query: CallbackQuery, callback_data: keyboards.ClassRoomActionCallback
 ):
 
     match callback_data.action:
         case "generate_qr_code":
-            ClassRoom = ClassRooms.objects.filter(
-                Number=callback_data.class_number,
-                Letter=callback_data.class_letter,
-            )
-
-            if not ClassRoom.exists():
+            if not (
+                ClassRoom := await repository.get_classroom_by_id(
+                    callback_data.classroom_id
+                )
+            ):
                 return
 
-            ClassRoom = ClassRoom.first()
-
-            link = await create_start_link(
-                bot, f"{ClassRoom.ClassRoomIdentifier}"
-            )
-            photo = utils.generate_invite_qr(link)
-
-            await bot.send_photo(
-                chat_id=query.from_user.id,
-                photo=photo,
-                caption="Подключайся к Моему Расписанию!",
-            )
+            await send_invite_qr(query.from_user.id, ClassRoom)
 
         case "edit":
             # await query.message.delete()
@@ -695,9 +885,16 @@ async def handle_view_classroom(
         case "back":
             await query.message.delete()
 
+            if not (
+                ClassRoom := await repository.get_classroom_by_id(
+                    callback_data.classroom_id
+                )
+            ):
+                return
+
             keyboard = utils.generate_specific_classrooms(
-                ClassRooms.objects.filter(Number=callback_data.class_number),
-                class_number=callback_data.class_number,
+                await repository.get_parallel_classrooms(ClassRoom.Number),
+                class_number=int(ClassRoom.Number),
                 purpose="view_classrooms",
             )
 
@@ -706,18 +903,140 @@ async def handle_view_classroom(
             )
 
 
-async def start_bot() -> None:
+def create_webhook_app(bot: Bot) -> web.Application:
+    """
+    aiohttp application that answers Telegram with 200 right away and
+    processes the update in the background. Requests without the secret
+    token get 401.
+    """
 
-    global bot
+    app = web.Application()
+
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=True,
+        secret_token=WEBHOOK_SECRET,
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    return app
+
+
+async def start_webhook(bot: Bot, app: web.Application) -> None:
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=WEBHOOK_HOST, port=WEBHOOK_PORT).start()
+
+    await bot.set_webhook(
+        f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def create_bot() -> Bot:
+
+    session = None
+
+    if TELEGRAM_API_URL:
+        session = AiohttpSession(
+            api=TelegramAPIServer.from_base(TELEGRAM_API_URL)
+        )
 
     bot = Bot(
-        token=TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+        token=TOKEN,
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
+    bot.session.middleware(metrics.RequestMetricsMiddleware())
+
+    return bot
+
+
+async def start_metrics(index: int = 0) -> None:
+
+    global metrics_runner
+
+    if METRICS_PORT:
+        metrics_runner = await metrics.serve(
+            METRICS_HOST, METRICS_PORT + index
+        )
+
+
+def start_senders() -> None:
+
+    global sender_tasks
+
+    # Keep references, otherwise the tasks may be garbage collected
+    sender_tasks = [asyncio.create_task(outbox_dispatcher.run(bot))]
+
+    if digest_scheduler:
+        sender_tasks.append(asyncio.create_task(digest_scheduler.run()))
+
+
+async def start_bot() -> None:
+
+    global bot
+
+    bot = create_bot()
+    await start_metrics()
+
+    start_senders()
+
+    if BOT_MODE == "webhook":
+        await start_webhook(bot, create_webhook_app(bot))
+    else:
+        # getUpdates is refused while a webhook is set
+        await bot.delete_webhook()
+        await dp.start_polling(bot)
 
-    await dp.start_polling(bot)
+
+async def start_worker(worker_bot: Bot, index: int) -> None:
+
+    global bot
+
+    bot = worker_bot
+    await start_metrics(index)
+
+    # One outbox drainer keeps Telegram's limits bot-wide, not per worker
+    if index == 0:
+        start_senders()
+
+
+async def start_supervisor(workers: supervisor.Supervisor) -> None:
+
+    receiving_bot = create_bot()
+
+    if BOT_MODE == "webhook":
+        receive = start_webhook(
+            receiving_bot,
+            workers.create_webhook_app(
+                receiving_bot, WEBHOOK_PATH, WEBHOOK_SECRET
+            ),
+        )
+    else:
+        receive = workers.poll(receiving_bot)
+
+    await workers.run(receive)
 
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO, stream=sys.stdout)
     dp.include_router(router)
-    asyncio.run(start_bot())
+
+    if BOT_WORKERS > 1:
+        # Workers are forked before any event loop or thread exists
+        workers = supervisor.Supervisor(
+            BOT_WORKERS, dp, create_bot, start_worker
+        )
+        workers.start()
+        asyncio.run(start_supervisor(workers))
+    else:
+        asyncio.run(start_bot())
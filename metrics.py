@@ -0,0 +1,303 @@
+import time
+import bisect
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator
+
+from aiohttp import web
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.filters.callback_data import CallbackData
+from aiogram.methods import TelegramMethod
+from aiogram.types import CallbackQuery, TelegramObject, Update
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+# Seconds, the same defaults prometheus_client uses
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value)
+            .replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("\n", "\\n"),
+        )
+        for name, value in labels
+    )
+    return f"{{{pairs}}}"
+
+
+class Counter:
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} counter",
+        ] + [
+            f"{self.name}{_labels(key)} {value}"
+            for key, value in self._values.items()
+        ]
+
+
+class Histogram:
+
+    def __init__(self, name: str, help: str, buckets: tuple = BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # labels -> [count per bucket..., +Inf count, sum]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+
+        if (series := self._values.get(key)) is None:
+            series = self._values[key] = [0] * (len(self.buckets) + 2)
+
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def collect(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} histogram",
+        ]
+
+        for key, series in self._values.items():
+            total = 0
+
+            for bound, count in zip((*self.buckets, "+Inf"), series):
+                total += count
+                lines.append(
+                    f"{self.name}_bucket{_labels(key + (('le', bound),))} "
+                    f"{total}"
+                )
+
+            lines.append(f"{self.name}_count{_labels(key)} {total}")
+            lines.append(f"{self.name}_sum{_labels(key)} {series[-1]}")
+
+        return lines
+
+
+handler_latency = Histogram(
+    "bot_handler_seconds", "Time spent in a handler, filters excluded"
+)
+update_latency = Histogram(
+    "bot_update_seconds", "Time spent on one update, middlewares included"
+)
+update_queries = Histogram(
+    "bot_update_db_queries",
+    "ORM queries run while handling one update",
+    QUERY_BUCKETS,
+)
+update_query_time = Histogram(
+    "bot_update_db_seconds", "Time spent in ORM queries for one update"
+)
+api_latency = Histogram("bot_telegram_api_seconds", "Latency of Bot API calls")
+api_errors = Counter(
+    "bot_telegram_api_errors_total", "Failed Bot API calls by error type"
+)
+
+REGISTRY = [
+    handler_latency,
+    update_latency,
+    update_queries,
+    update_query_time,
+    api_latency,
+    api_errors,
+]
+
+
+class QueryStats:
+    __slots__ = ("count", "time")
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+
+# sync_to_async copies the context into the ORM thread, so queries run on
+# behalf of an update are added to every QueryStats open around it
+_query_stats: ContextVar[tuple[QueryStats, ...]] = ContextVar(
+    "query_stats", default=()
+)
+
+
+def _record_query(execute, sql, params, many, context):
+
+    if not (active := _query_stats.get()):
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+
+        for stats in active:
+            stats.count += 1
+            stats.time += elapsed
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryStats]:
+    """
+    Counts the ORM queries run in this context, including the ones the
+    async ORM runs in its worker thread.
+    """
+
+    stats = QueryStats()
+    token = _query_stats.set(_query_stats.get() + (stats,))
+
+    try:
+        yield stats
+    finally:
+        _query_stats.reset(token)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(_on_connection_created)
+
+
+def _update_type(update: Update) -> str:
+
+    if isinstance(event := update.event, CallbackQuery):
+        # CallbackData prefix, e.g. "ScheduleDay" out of "ScheduleDay:3:0".
+        # Only known prefixes, callback data is chosen by the client
+        prefix = (event.data or "").split(":", 1)[0]
+        known = {cls.__prefix__ for cls in CallbackData.__subclasses__()}
+
+        return f"callback:{prefix if prefix in known else 'other'}"
+
+    return update.event_type
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """
+    Outer update middleware: total latency and ORM usage per update type
+    (message, or callback:<prefix> for callback queries).
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+
+        started = time.perf_counter()
+
+        with count_queries() as stats:
+            try:
+                return await handler(event, data)
+            finally:
+                update_type = _update_type(event)
+
+                update_latency.observe(
+                    time.perf_counter() - started, update_type=update_type
+                )
+                update_queries.observe(stats.count, update_type=update_type)
+                update_query_time.observe(stats.time, update_type=update_type)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Inner middleware: latency of the handler that matched, by its name.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+
+        handler_object: HandlerObject = data["handler"]
+        started = time.perf_counter()
+
+        try:
+            return await handler(event, data)
+        finally:
+            handler_latency.observe(
+                time.perf_counter() - started,
+                handler=handler_object.callback.__name__,
+            )
+
+
+class RequestMetricsMiddleware(BaseRequestMiddleware):
+    """
+    Bot session middleware: latency and errors of every Bot API call.
+    """
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+    ):
+
+        name = type(method).__name__
+        started = time.perf_counter()
+
+        try:
+            return await make_request(bot, method)
+        except Exception as error:
+            api_errors.inc(method=name, error=type(error).__name__)
+            raise
+        finally:
+            api_latency.observe(time.perf_counter() - started, method=name)
+
+
+def render() -> str:
+    return (
+        "\n".join(line for metric in REGISTRY for line in metric.collect())
+        + "\n"
+    )
+
+
+async def serve(host: str, port: int) -> web.AppRunner:
+    """
+    Starts the /metrics endpoint in the running loop.
+    """
+
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(
+            text=render(), content_type="text/plain", charset="utf-8"
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+
+    logger.info("Metrics are served on http://%s:%s/metrics", host, port)
+
+    return runner
@@ -0,0 +1,50 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+import repository
+
+
+class DatabaseConnectionMiddleware(BaseMiddleware):
+    """
+    Does per update what Django does per request: drops a connection that
+    is broken or past CONN_MAX_AGE, and lets CONN_HEALTH_CHECKS check it
+    again before the next query. The bot sends no request signals, so
+    without this a dropped connection stays broken until a restart.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+
+        # The same thread as the ORM calls, so the same connection
+        await sync_to_async(close_old_connections)()
+
+        return await handler(event, data)
+
+
+class IdentityMiddleware(BaseMiddleware):
+    """
+    Resolves the sender once per update and passes it to handlers as
+    `identity` (repository.Identity, or None for unknown users).
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+
+        user: User = data.get("event_from_user")
+        data["identity"] = (
+            await repository.get_identity(user.id) if user else None
+        )
+
+        return await handler(event, data)
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+
+from aiogram import Bot
+
+import repository
+from broadcast import Broadcaster
+
+logger = logging.getLogger(__name__)
+
+IDLE_INTERVAL = 5  # seconds between polls when the outbox is empty
+
+
+class OutboxDispatcher:
+    """
+    Drains the Notifications outbox through a Broadcaster, claiming only as
+    many rows as it sends at once: a row is SENDING only while its message
+    is on the way, so a crash fails those and leaves the rest pending.
+    Everything it needs is in the database, so after a restart it simply
+    continues with the rows that are still pending.
+    """
+
+    def __init__(self, broadcaster: Broadcaster):
+        self.broadcaster = broadcaster
+        self._wakeup = asyncio.Event()
+
+    def notify(self):
+        # Called after a commit that enqueued rows, skips the idle wait
+        self._wakeup.set()
+
+    async def _send(self, bot: Bot, notification) -> bool:
+        return await self.broadcaster.send_one(
+            bot,
+            notification.TelegramId,
+            notification.Text,
+            parse_mode=notification.ParseMode,
+        )
+
+    async def _report(self, bot: Bot, batch: str, report_to: int):
+
+        if not (counts := await repository.get_finished_batch_counts(batch)):
+            return
+
+        delivered, failed = counts
+        text = f"🔔 Уведомление об изменении получили {delivered} из {delivered + failed} учеников"
+        if failed:
+            text += f"\nНе удалось доставить: {failed}"
+
+        await self.broadcaster.send_one(bot, report_to, text)
+
+    async def drain(self, bot: Bot) -> int:
+        """
+        Sends everything that is pending right now, returns the number of
+        processed rows.
+        """
+
+        processed = 0
+
+        while notifications := await repository.claim_notifications(
+            self.broadcaster.concurrency
+        ):
+            results = await asyncio.gather(
+                *(
+                    self._send(bot, notification)
+                    for notification in notifications
+                )
+            )
+
+            await repository.finish_notifications(
+                [n.pk for n, ok in zip(notifications, results) if ok], True
+            )
+            await repository.finish_notifications(
+                [n.pk for n, ok in zip(notifications, results) if not ok],
+                False,
+            )
+
+            for batch, report_to in {
+                (n.Batch, n.ReportTo) for n in notifications if n.ReportTo
+            }:
+                await self._report(bot, batch, report_to)
+
+            processed += len(notifications)
+
+        return processed
+
+    async def run(self, bot: Bot):
+
+        interrupted, batches = (
+            await repository.fail_interrupted_notifications()
+        )
+
+        if interrupted:
+            logger.warning(
+                "%s notifications were interrupted by a restart", interrupted
+            )
+
+        # A batch with nothing pending is finished now and no drain would
+        # report it; _report skips the others, drain reports them later
+        for batch, report_to in batches:
+            await self._report(bot, batch, report_to)
+
+        while True:
+
+            try:
+                await self.drain(bot)
+            except Exception:
+                logger.exception("Outbox dispatcher failed, retrying")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), IDLE_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+            self._wakeup.clear()
@@ -0,0 +1,17 @@
+from qrcode_styled import QRCodeStyled
+
+# Kept free of Django and aiogram imports: this module is loaded by the
+# QR rendering worker processes.
+
+
+def render_invite_qr(link: str) -> bytes:
+
+    qr = QRCodeStyled()
+    image_buffer = qr.get_buffer(
+        data=link,
+        # image=Image.open("image.png"), # temp
+        _format="PNG",
+    )
+    image_buffer.seek(0)
+
+    return image_buffer.getvalue()
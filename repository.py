@@ -0,0 +1,1006 @@
+import json
+import uuid
+import hashlib
+from itertools import islice
+from typing import NamedTuple, Union
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+from django.db.models.functions import Length
+from django.db.models.signals import post_delete, post_save
+
+import utils
+from cache import LRUCache, MISSING
+from Models.models import (
+    Users,
+    ClassRooms,
+    ScheduleDays,
+    ScheduleDayVersions,
+    Lessons,
+    Notifications,
+    FSMStates,
+)
+
+# Every database access made from a handler goes through this module.
+# Only Django's native async ORM API is used here, so no coroutine ever
+# blocks the event loop on a query. Transactions can't span awaits, so
+# the few multi-statement writes are plain functions run via sync_to_async.
+
+
+class Identity(NamedTuple):
+    pk: int
+    UserType: str
+    ClassRoom_id: Union[int, None]
+
+    @property
+    def is_pupil(self) -> bool:
+        return self.UserType == Users.UserTypeChoices.PUPIL
+
+    @property
+    def is_teacher(self) -> bool:
+        return self.UserType == Users.UserTypeChoices.TEACHER
+
+
+# TelegramId -> Identity (or None for unknown users). Entries are dropped
+# whenever a user is created or changed through this module.
+identity_cache = LRUCache(maxsize=10_000, ttl=300)
+
+
+async def load_identity(telegram_id: int) -> Union[Identity, None]:
+    row = (
+        await Users.objects.filter(TelegramId=telegram_id)
+        .values_list("pk", "UserType", "ClassRoom_id")
+        .afirst()
+    )
+    return Identity(*row) if row else None
+
+
+async def get_identity(telegram_id: int) -> Union[Identity, None]:
+
+    if (identity := identity_cache.get(telegram_id)) is MISSING:
+        identity = await load_identity(telegram_id)
+        identity_cache.set(telegram_id, identity)
+
+    return identity
+
+
+# Set by supervisor workers: forwards every invalidation to the other worker
+# processes, whose caches would otherwise keep serving the old value
+publish_invalidation = None
+
+
+def invalidate(cache: str, key=None):
+    apply_invalidation(cache, key)
+
+    if publish_invalidation:
+        publish_invalidation(cache, key)
+
+
+def apply_invalidation(cache: str, key=None):
+    global classrooms_version
+
+    match cache:
+        case "identity":
+            identity_cache.invalidate(key)
+        case "schedule":
+            schedule_cache.invalidate(key)
+        case "classrooms":
+            classrooms_version += 1
+
+
+async def create_pupil(
+    telegram_id: int, fullname: str, ClassRoom: ClassRooms
+) -> Users:
+    User, _ = await Users.objects.aget_or_create(
+        TelegramId=telegram_id,
+        defaults={
+            "Fullname": fullname,
+            "ClassRoom": ClassRoom,
+            "UserType": Users.UserTypeChoices.PUPIL,
+        },
+    )
+    invalidate("identity", telegram_id)
+    return User
+
+
+async def create_teacher(telegram_id: int, fullname: str) -> Users:
+    # TelegramId is unique, so an existing pupil is promoted to teacher
+    User, _ = await Users.objects.aupdate_or_create(
+        TelegramId=telegram_id,
+        defaults={
+            "Fullname": fullname,
+            "ClassRoom": None,
+            "UserType": Users.UserTypeChoices.TEACHER,
+        },
+    )
+    invalidate("identity", telegram_id)
+    return User
+
+
+async def classroom_exists_by_identifier(identifier: str) -> bool:
+    return await ClassRooms.objects.filter(
+        ClassRoomIdentifier=identifier
+    ).aexists()
+
+
+async def get_classroom_by_identifier(
+    identifier: str,
+) -> Union[ClassRooms, None]:
+    return await ClassRooms.objects.filter(
+        ClassRoomIdentifier=identifier
+    ).afirst()
+
+
+async def get_classroom_by_id(ClassRoom_id: int) -> Union[ClassRooms, None]:
+    return await ClassRooms.objects.filter(pk=ClassRoom_id).afirst()
+
+
+async def get_classroom(
+    class_number: Union[int, str], class_letter: str
+) -> Union[ClassRooms, None]:
+    return await ClassRooms.objects.filter(
+        Number=class_number, Letter=class_letter
+    ).afirst()
+
+
+async def create_classroom(
+    class_number: str, class_letter: str
+) -> Union[ClassRooms, None]:
+    # Returns None when a class with this number and letter already exists
+    try:
+        return await ClassRooms.objects.acreate(
+            Number=class_number, Letter=class_letter
+        )
+    except IntegrityError:
+        return None
+
+
+# Bumped on every ClassRooms write. Lists are cached under the version they
+# were read at, so nothing read before a change is ever served after it.
+classrooms_version = 0
+classroom_lists_cache = LRUCache(maxsize=1_000)
+
+
+def _on_classrooms_change(**kwargs):
+    invalidate("classrooms")
+
+
+post_save.connect(_on_classrooms_change, sender=ClassRooms)
+post_delete.connect(_on_classrooms_change, sender=ClassRooms)
+
+
+async def get_class_numbers() -> tuple[str, ...]:
+
+    async def load():
+        return tuple(
+            [
+                number
+                async for number in ClassRooms.objects.values_list(
+                    "Number", flat=True
+                ).distinct()
+            ]
+        )
+
+    return await classroom_lists_cache.get_or_load(
+        (classrooms_version, "numbers"), load
+    )
+
+
+async def get_parallel_classrooms(
+    class_number: Union[int, str],
+) -> tuple[tuple[int, str], ...]:
+    # (pk, Letter) of every class in the parallel, the pk goes to buttons
+
+    async def load():
+        return tuple(
+            [
+                classroom
+                async for classroom in ClassRooms.objects.filter(
+                    Number=class_number
+                ).values_list("pk", "Letter")
+            ]
+        )
+
+    return await classroom_lists_cache.get_or_load(
+        (classrooms_version, "parallel", str(class_number)), load
+    )
+
+
+async def set_invite_qr_file_id(ClassRoom: ClassRooms, file_id: str):
+    # update() skips post_save, a new file_id doesn't change the class list
+    await ClassRooms.objects.filter(pk=ClassRoom.pk).aupdate(
+        InviteQRFileId=file_id
+    )
+    ClassRoom.InviteQRFileId = file_id
+
+
+async def get_pupil_names(ClassRoom: ClassRooms) -> list[str]:
+    return [
+        fullname
+        async for fullname in Users.objects.filter(
+            ClassRoom=ClassRoom
+        ).values_list("Fullname", flat=True)
+    ]
+
+
+def schedule_hash(lesson_names: list[str]) -> str:
+    return hashlib.blake2b(
+        json.dumps(lesson_names, ensure_ascii=False).encode(), digest_size=8
+    ).hexdigest()
+
+
+def trim_lesson_names(lesson_names: list[str]) -> list[str]:
+    # Free periods after the last lesson are no lessons at all: "A\nB\n"
+    # is the same day as "A\nB", with the same hash
+    lesson_names = list(lesson_names)
+
+    while lesson_names and not lesson_names[-1]:
+        lesson_names.pop()
+
+    return lesson_names
+
+
+def names_by_order(lessons) -> list[str]:
+    # (Order, SubjectName) rows -> names by position, "" for a free period
+    names = []
+
+    for order, name in lessons:
+        names.extend([""] * (order - 1 - len(names)))
+        names.append(name)
+
+    return names
+
+
+async def load_days(**filters) -> dict[tuple[int, int], list[str]]:
+    """
+    (ClassRoom pk, DayOfWeek) -> lesson names of the ScheduleDays matching
+    `filters`, whichever form each day is stored in. With PACKED_SCHEDULES
+    one query reads the days alone, plus one for all days still stored as
+    rows; otherwise one query joins the days with their Lessons.
+    """
+
+    days = {}
+
+    if settings.PACKED_SCHEDULES:
+        unpacked = {}
+
+        async for pk, ClassRoom_id, day, names in ScheduleDays.objects.filter(
+            **filters
+        ).values_list("pk", "Classroom_id", "DayOfWeek", "LessonNames"):
+            if names is None:
+                unpacked[pk] = (ClassRoom_id, day)
+            else:
+                days[(ClassRoom_id, day)] = names
+
+        if unpacked:
+            lessons = {}
+
+            async for ScheduleDay_id, order, name in (
+                Lessons.objects.filter(ScheduleDay_id__in=unpacked)
+                .order_by("Order")
+                .values_list("ScheduleDay_id", "Order", "SubjectName")
+            ):
+                lessons.setdefault(ScheduleDay_id, []).append((order, name))
+
+            for pk, key in unpacked.items():
+                days[key] = names_by_order(lessons.get(pk, []))
+
+        return days
+
+    # The LEFT JOIN yields one row per lesson, or one row for a packed day
+    lessons = {}
+
+    async for ClassRoom_id, day, names, order, name in (
+        ScheduleDays.objects.filter(**filters)
+        .order_by("Lessons__Order")
+        .values_list(
+            "Classroom_id",
+            "DayOfWeek",
+            "LessonNames",
+            "Lessons__Order",
+            "Lessons__SubjectName",
+        )
+    ):
+        if names is not None:
+            days[(ClassRoom_id, day)] = names
+        else:
+            lessons.setdefault((ClassRoom_id, day), [])
+            if order is not None:
+                lessons[(ClassRoom_id, day)].append((order, name))
+
+    for key, day_lessons in lessons.items():
+        days[key] = names_by_order(day_lessons)
+
+    return days
+
+
+async def get_lesson_names(ClassRoom_id: int, day: int) -> list[str]:
+    # Reading never creates the day, replace_lessons does that on save
+    days = await load_days(Classroom_id=ClassRoom_id, DayOfWeek=day)
+    # A free period stays an empty line, or the lessons after it would move
+    # up a position when the editor text is saved back
+    return trim_lesson_names(days.get((ClassRoom_id, day), []))
+
+
+# (ClassRoom pk, DayOfWeek) -> rendered lessons, or None for an empty day.
+# DayOfWeek None holds the whole week.
+# Writers of lessons (replace_lessons, import_schedule) drop the entries.
+schedule_cache = LRUCache(maxsize=5_000)
+
+
+async def get_schedule_text(ClassRoom_id: int, day: int) -> Union[str, None]:
+
+    async def load():
+        days = await load_days(Classroom_id=ClassRoom_id, DayOfWeek=day)
+        return (
+            utils.generate_lessons_text(days.get((ClassRoom_id, day), []))
+            or None
+        )
+
+    return await schedule_cache.get_or_load((ClassRoom_id, day), load)
+
+
+async def get_week_schedule_text(ClassRoom_id: int) -> Union[str, None]:
+
+    async def load():
+        # One query for all five days
+        days = await load_days(Classroom_id=ClassRoom_id)
+        return (
+            utils.generate_week_text(
+                {day: names for (_, day), names in days.items()}
+            )
+            or None
+        )
+
+    return await schedule_cache.get_or_load((ClassRoom_id, None), load)
+
+
+class ScheduleChange(NamedTuple):
+    version: int
+    old: list[str]
+    new: list[str]
+
+
+async def replace_lessons(
+    ClassRoom: ClassRooms,
+    day: int,
+    lesson_names: list[str],
+    notify: bool = False,
+    report_to: Union[int, None] = None,
+) -> Union[ScheduleChange, None]:
+    """
+    Saves a new version of a day in one transaction. Returns None without
+    writing anything when the lessons are the ones already stored, as told
+    by ContentHash. Packed, a change is a single UPDATE of the day; as rows,
+    only the rows whose subject changed are touched. With `notify`, every
+    pupil of the class gets the diff through the outbox, written in the
+    same transaction so the change and its announcement are stored
+    together.
+    """
+
+    change = await _replace_lessons(
+        ClassRoom, day, lesson_names, notify, report_to
+    )
+
+    if change:
+        invalidate("schedule", (ClassRoom.pk, day))
+        invalidate("schedule", (ClassRoom.pk, None))
+
+    return change
+
+
+def _write_lesson_rows(
+    ScheduleDay: ScheduleDays, lessons: list[Lessons], lesson_names: list[str]
+):
+
+    # The first row of each Order is reused, duplicates left by older
+    # racing saves are deleted with the rows past the end of the list
+    lessons_by_order = {}
+    for lesson in lessons:
+        lessons_by_order.setdefault(lesson.Order, lesson)
+
+    kept = set()
+    to_create = []
+    to_update = []
+
+    for order, lesson_name in enumerate(lesson_names, start=1):
+
+        if not (lesson := lessons_by_order.get(order)):
+            to_create.append(
+                Lessons(
+                    ScheduleDay=ScheduleDay,
+                    Order=order,
+                    SubjectName=lesson_name,
+                )
+            )
+            continue
+
+        kept.add(lesson.pk)
+
+        if lesson.SubjectName != lesson_name:
+            lesson.SubjectName = lesson_name
+            to_update.append(lesson)
+
+    # `lessons` are all rows of the day, read under the day's lock
+    if len(kept) < len(lessons):
+        Lessons.objects.filter(ScheduleDay=ScheduleDay).exclude(
+            pk__in=kept
+        ).delete()
+
+    if to_update:
+        Lessons.objects.bulk_update(to_update, ["SubjectName"])
+
+    if to_create:
+        Lessons.objects.bulk_create(to_create)
+
+
+@sync_to_async
+def _replace_lessons(
+    ClassRoom: ClassRooms,
+    day: int,
+    lesson_names: list[str],
+    notify: bool,
+    report_to: Union[int, None],
+) -> Union[ScheduleChange, None]:
+
+    lesson_names = trim_lesson_names(lesson_names)
+    content_hash = schedule_hash(lesson_names)
+
+    with transaction.atomic():
+        # Locked, two teachers saving the same day diff against each other
+        (
+            ScheduleDay,
+            _,
+        ) = ScheduleDays.objects.select_for_update().get_or_create(
+            Classroom=ClassRoom, DayOfWeek=day
+        )
+
+        if ScheduleDay.ContentHash == content_hash:
+            return None
+
+        if ScheduleDay.LessonNames is not None:
+            lessons = []
+            old_names = trim_lesson_names(ScheduleDay.LessonNames)
+        else:
+            lessons = list(Lessons.objects.filter(ScheduleDay=ScheduleDay))
+            old_names = trim_lesson_names(
+                names_by_order(
+                    (lesson.Order, lesson.SubjectName) for lesson in lessons
+                )
+            )
+
+        if old_names == lesson_names:
+            # Saved before days had a hash
+            ScheduleDays.objects.filter(pk=ScheduleDay.pk).update(
+                ContentHash=content_hash
+            )
+            return None
+
+        if settings.PACKED_SCHEDULES:
+            if lessons:
+                Lessons.objects.filter(ScheduleDay=ScheduleDay).delete()
+            packed = lesson_names
+        else:
+            _write_lesson_rows(ScheduleDay, lessons, lesson_names)
+            packed = None
+
+        version = ScheduleDay.Version + 1
+
+        ScheduleDays.objects.filter(pk=ScheduleDay.pk).update(
+            LessonNames=packed, ContentHash=content_hash, Version=version
+        )
+        ScheduleDayVersions.objects.create(
+            ScheduleDay=ScheduleDay,
+            Version=version,
+            LessonNames=lesson_names,
+            ContentHash=content_hash,
+            ChangedBy=report_to,
+        )
+
+        if notify and (
+            text := utils.generate_schedule_change_text(
+                day, old_names, lesson_names
+            )
+        ):
+            enqueue_notifications(
+                Users.objects.filter(ClassRoom=ClassRoom).values_list(
+                    "TelegramId", flat=True
+                ),
+                text,
+                parse_mode="Markdown",
+                report_to=report_to,
+            )
+
+    return ScheduleChange(version, old_names, lesson_names)
+
+
+class ImportSummary(NamedTuple):
+    classrooms: int
+    created_classrooms: int
+    days: int
+    changed_days: int
+    lessons: int
+
+
+async def import_schedule(
+    rows, changed_by: Union[int, None] = None
+) -> ImportSummary:
+    """
+    Replaces the lessons of every (class, day) present in `rows` (validated
+    schedule_import.ImportRow) in one transaction, creating missing classes
+    and days. Days whose ContentHash matches the file are not written; days
+    and classes not in the file are left alone. Nobody is notified; the
+    new versions record `changed_by` (the teacher's TelegramId).
+    """
+
+    summary, changed = await _import_schedule(rows, changed_by)
+
+    for ClassRoom_id, day in changed:
+        invalidate("schedule", (ClassRoom_id, day))
+    for ClassRoom_id in {ClassRoom_id for ClassRoom_id, _ in changed}:
+        invalidate("schedule", (ClassRoom_id, None))
+
+    # bulk_create sends no post_save, the class lists are dropped here
+    if summary.created_classrooms:
+        invalidate("classrooms")
+
+    return summary
+
+
+@sync_to_async
+def _import_schedule(rows, changed_by: Union[int, None]):
+
+    with transaction.atomic():
+        classrooms = {
+            (Number, Letter.upper()): pk
+            for pk, Number, Letter in ClassRooms.objects.values_list(
+                "pk", "Number", "Letter"
+            )
+        }
+        missing = {(row.Number, row.Letter) for row in rows} - set(classrooms)
+
+        if missing:
+            ClassRooms.objects.bulk_create(
+                ClassRooms(Number=Number, Letter=Letter)
+                for Number, Letter in sorted(missing)
+            )
+            classrooms.update(
+                ((Number, Letter), pk)
+                for pk, Number, Letter in ClassRooms.objects.filter(
+                    Letter__in={Letter for _, Letter in missing}
+                ).values_list("pk", "Number", "Letter")
+                if (Number, Letter) in missing
+            )
+
+        lessons = {}
+        for row in rows:
+            lessons.setdefault(
+                (classrooms[(row.Number, row.Letter)], row.day), []
+            ).append((row.order, row.subject))
+
+        names = {
+            key: names_by_order(sorted(day_lessons))
+            for key, day_lessons in lessons.items()
+        }
+        hashes = {
+            key: schedule_hash(day_names) for key, day_names in names.items()
+        }
+        ClassRoom_ids = {ClassRoom_id for ClassRoom_id, _ in names}
+
+        def existing_days():
+            return {
+                (ClassRoom_id, day): (pk, content_hash, version)
+                for pk, ClassRoom_id, day, content_hash, version in (
+                    ScheduleDays.objects.filter(
+                        Classroom_id__in=ClassRoom_ids
+                    ).values_list(
+                        "pk",
+                        "Classroom_id",
+                        "DayOfWeek",
+                        "ContentHash",
+                        "Version",
+                    )
+                )
+            }
+
+        days = existing_days()
+        changed = [
+            key
+            for key in names
+            if key not in days or days[key][1] != hashes[key]
+        ]
+        versions = {
+            key: days[key][2] + 1 if key in days else 1 for key in changed
+        }
+        packed = settings.PACKED_SCHEDULES
+
+        # Days without a hash yet count as changed, they are simply rewritten
+        ScheduleDays.objects.bulk_update(
+            [
+                ScheduleDays(
+                    pk=days[key][0],
+                    LessonNames=names[key] if packed else None,
+                    ContentHash=hashes[key],
+                    Version=versions[key],
+                )
+                for key in changed
+                if key in days
+            ],
+            ["LessonNames", "ContentHash", "Version"],
+            batch_size=500,
+        )
+        Lessons.objects.filter(
+            ScheduleDay_id__in=[days[key][0] for key in changed if key in days]
+        ).delete()
+
+        if created := [key for key in changed if key not in days]:
+            ScheduleDays.objects.bulk_create(
+                [
+                    ScheduleDays(
+                        Classroom_id=ClassRoom_id,
+                        DayOfWeek=day,
+                        LessonNames=(
+                            names[(ClassRoom_id, day)] if packed else None
+                        ),
+                        ContentHash=hashes[(ClassRoom_id, day)],
+                        Version=1,
+                    )
+                    for ClassRoom_id, day in created
+                ],
+                batch_size=500,
+            )
+            days = existing_days()
+
+        if not packed:
+            Lessons.objects.bulk_create(
+                (
+                    Lessons(
+                        ScheduleDay_id=days[key][0],
+                        Order=order,
+                        SubjectName=name,
+                    )
+                    for key in changed
+                    for order, name in enumerate(names[key], start=1)
+                    if name
+                ),
+                batch_size=500,
+            )
+
+        ScheduleDayVersions.objects.bulk_create(
+            (
+                ScheduleDayVersions(
+                    ScheduleDay_id=days[key][0],
+                    Version=versions[key],
+                    LessonNames=names[key],
+                    ContentHash=hashes[key],
+                    ChangedBy=changed_by,
+                )
+                for key in changed
+            ),
+            batch_size=500,
+        )
+
+    summary = ImportSummary(
+        classrooms=len(ClassRoom_ids),
+        created_classrooms=len(missing),
+        days=len(names),
+        changed_days=len(changed),
+        lessons=len(rows),
+    )
+
+    return summary, changed
+
+
+async def get_day_digests(day: int) -> list[tuple[int, str, list[int]]]:
+    """
+    (ClassRoom pk, rendered lessons, pupil TelegramIds) for every class with
+    lessons on `day`, in two or three queries however many classes there
+    are.
+    """
+
+    lessons_by_classroom = {
+        ClassRoom_id: names
+        for (ClassRoom_id, _), names in (
+            await load_days(DayOfWeek=day)
+        ).items()
+        if any(names)
+    }
+
+    pupils_by_classroom = {}
+
+    async for ClassRoom_id, telegram_id in Users.objects.filter(
+        ClassRoom_id__in=lessons_by_classroom
+    ).values_list("ClassRoom_id", "TelegramId"):
+        pupils_by_classroom.setdefault(ClassRoom_id, []).append(telegram_id)
+
+    return [
+        (
+            ClassRoom_id,
+            utils.generate_lessons_text(names),
+            pupils_by_classroom[ClassRoom_id],
+        )
+        for ClassRoom_id, names in lessons_by_classroom.items()
+        if ClassRoom_id in pupils_by_classroom
+    ]
+
+
+# Rows read per round trip by the exports; memory stays flat however big
+# the school is
+EXPORT_CHUNK_SIZE = 2_000
+
+
+async def _iterate(queryset, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    queryset.iterator() read `chunk_size` rows per trip to the ORM thread.
+    Django's aiterator() starts values_list() queries on the event loop,
+    which the async safety check refuses.
+    """
+
+    rows = queryset.iterator(chunk_size=chunk_size)
+    next_chunk = sync_to_async(lambda: list(islice(rows, chunk_size)))
+
+    while chunk := await next_chunk():
+        for row in chunk:
+            yield row
+
+
+def _export_order(path: str = "") -> tuple:
+    # Numbers are strings, a shorter one is a lower class: 5 < 10
+    return (
+        Length(f"{path}Number"),
+        f"{path}Number",
+        f"{path}Letter",
+        f"{path}id",
+    )
+
+
+async def iter_export_lessons():
+    """
+    (Number, Letter, DayOfWeek, Order, SubjectName) of every lesson, by
+    class, day and order. The LEFT JOIN brings one row per lesson, or one
+    row for a packed day.
+    """
+
+    async for Number, Letter, day, names, order, name in _iterate(
+        ScheduleDays.objects.order_by(
+            *_export_order("Classroom__"), "DayOfWeek", "Lessons__Order"
+        ).values_list(
+            "Classroom__Number",
+            "Classroom__Letter",
+            "DayOfWeek",
+            "LessonNames",
+            "Lessons__Order",
+            "Lessons__SubjectName",
+        )
+    ):
+        if names is not None:
+            for order, name in enumerate(names, start=1):
+                if name:
+                    yield Number, Letter, day, order, name
+        # A free period saved through the editor is a row with no name
+        elif order is not None and name:
+            yield Number, Letter, day, order, name
+
+
+async def iter_export_pupils():
+    """
+    (Number, Letter, Fullname) of every pupil, by class.
+    """
+
+    async for row in _iterate(
+        Users.objects.filter(
+            UserType=Users.UserTypeChoices.PUPIL, ClassRoom__isnull=False
+        )
+        .order_by(*_export_order("ClassRoom__"), "pk")
+        .values_list("ClassRoom__Number", "ClassRoom__Letter", "Fullname")
+    ):
+        yield row
+
+
+async def iter_export_classrooms(batch_size: int = 100):
+    """
+    (Number, Letter, [(DayOfWeek, Order, SubjectName)], [Fullname]) of
+    every class, including empty ones. Lessons and pupils are read for
+    `batch_size` classes at a time, three or four queries per batch.
+    """
+
+    async def load(batch):
+        lessons = {}
+        pupils = {}
+
+        for (ClassRoom_id, day), names in sorted(
+            (await load_days(Classroom_id__in=batch)).items()
+        ):
+            lessons.setdefault(ClassRoom_id, []).extend(
+                (day, order, name)
+                for order, name in enumerate(names, start=1)
+                if name
+            )
+
+        async for ClassRoom_id, fullname in (
+            Users.objects.filter(ClassRoom_id__in=batch)
+            .order_by("pk")
+            .values_list("ClassRoom_id", "Fullname")
+        ):
+            pupils.setdefault(ClassRoom_id, []).append(fullname)
+
+        return [
+            (Number, Letter, lessons.get(pk, []), pupils.get(pk, []))
+            for pk, (Number, Letter) in batch.items()
+        ]
+
+    batch = {}
+
+    async for pk, Number, Letter in _iterate(
+        ClassRooms.objects.order_by(*_export_order()).values_list(
+            "pk", "Number", "Letter"
+        ),
+        batch_size,
+    ):
+        batch[pk] = (Number, Letter)
+
+        if len(batch) == batch_size:
+            for row in await load(batch):
+                yield row
+            batch = {}
+
+    if batch:
+        for row in await load(batch):
+            yield row
+
+
+def enqueue_notifications(
+    telegram_ids,
+    text: str,
+    parse_mode: Union[str, None] = None,
+    report_to: Union[int, None] = None,
+    batch: Union[str, None] = None,
+) -> str:
+    """
+    Puts one outbox row per recipient. The idempotency key is unique, so
+    enqueueing the same batch twice never produces a second message.
+    """
+
+    batch = batch or uuid.uuid4().hex
+
+    Notifications.objects.bulk_create(
+        [
+            Notifications(
+                IdempotencyKey=f"{batch}:{telegram_id}",
+                Batch=batch,
+                TelegramId=telegram_id,
+                Text=text,
+                ParseMode=parse_mode,
+                ReportTo=report_to,
+            )
+            for telegram_id in set(telegram_ids)
+        ],
+        ignore_conflicts=True,
+    )
+
+    return batch
+
+
+aenqueue_notifications = sync_to_async(enqueue_notifications)
+
+
+@sync_to_async
+def claim_notifications(limit: int) -> list[Notifications]:
+    """
+    Takes the oldest pending rows and marks them as being sent, so a crashed
+    dispatcher never sends them again.
+    """
+
+    with transaction.atomic():
+        # skip_locked lets several processes drain the outbox on PostgreSQL,
+        # SQLite serializes writers anyway and ignores it
+        notifications = list(
+            Notifications.objects.select_for_update(skip_locked=True).filter(
+                Status=Notifications.StatusChoices.PENDING
+            )[:limit]
+        )
+        Notifications.objects.filter(
+            pk__in=[notification.pk for notification in notifications]
+        ).update(Status=Notifications.StatusChoices.SENDING)
+
+    return notifications
+
+
+async def finish_notifications(pks: list[int], delivered: bool):
+    await Notifications.objects.filter(pk__in=pks).aupdate(
+        Status=(
+            Notifications.StatusChoices.SENT
+            if delivered
+            else Notifications.StatusChoices.FAILED
+        )
+    )
+
+
+@sync_to_async
+def fail_interrupted_notifications() -> tuple[int, set[tuple[str, int]]]:
+    """
+    Marks rows left in SENDING by a crash as failed, they may already have
+    been delivered. Returns how many there were and the (Batch, ReportTo)
+    of the batches a teacher waits for a report on.
+    """
+
+    with transaction.atomic():
+        interrupted = Notifications.objects.filter(
+            Status=Notifications.StatusChoices.SENDING
+        )
+        batches = set(
+            interrupted.exclude(ReportTo=None)
+            .values_list("Batch", "ReportTo")
+            .distinct()
+        )
+
+        return (
+            interrupted.update(Status=Notifications.StatusChoices.FAILED),
+            batches,
+        )
+
+
+async def get_finished_batch_counts(
+    batch: str,
+) -> Union[tuple[int, int], None]:
+    """
+    Returns (delivered, failed) for a batch, or None while some of its
+    messages are still waiting.
+    """
+
+    counts = {
+        status: total
+        async for status, total in Notifications.objects.filter(Batch=batch)
+        .values_list("Status")
+        .annotate(total=Count("pk"))
+        .order_by()
+    }
+
+    if counts.get(Notifications.StatusChoices.PENDING) or counts.get(
+        Notifications.StatusChoices.SENDING
+    ):
+        return None
+
+    return (
+        counts.get(Notifications.StatusChoices.SENT, 0),
+        counts.get(Notifications.StatusChoices.FAILED, 0),
+    )
+
+
+async def load_fsm_state(key: str) -> tuple[Union[str, None], dict]:
+    row = (
+        await FSMStates.objects.filter(Key=key)
+        .values_list("State", "Data")
+        .afirst()
+    )
+    return row if row else (None, {})
+
+
+@sync_to_async
+def save_fsm_states(records: dict[str, tuple[Union[str, None], dict]]):
+    """
+    Writes many FSM records in one transaction. Cleared records (no state,
+    no data) are deleted instead of being kept as empty rows.
+    """
+
+    with transaction.atomic():
+        FSMStates.objects.filter(
+            Key__in=[
+                key
+                for key, (state, data) in records.items()
+                if state is None and not data
+            ]
+        ).delete()
+
+        FSMStates.objects.bulk_create(
+            [
+                FSMStates(Key=key, State=state, Data=data)
+                for key, (state, data) in records.items()
+                if state is not None or data
+            ],
+            update_conflicts=True,
+            unique_fields=["Key"],
+            update_fields=["State", "Data"],
+        )
@@ -0,0 +1,149 @@
+import io
+import csv
+import json
+from typing import AsyncIterator
+
+from aiogram import Bot
+from aiogram.types import InputFile
+
+import utils
+import repository
+
+# Every export is an async generator of encoded chunks of about CHUNK_SIZE
+# characters. Rows come from the database in chunks as well, so neither
+# side ever holds the whole file.
+
+CHUNK_SIZE = 64 * 1024
+
+# Same columns as schedule_import reads, an export can be imported back
+SCHEDULE_HEADER = ["Класс", "День", "Урок", "Предмет"]
+PUPILS_HEADER = ["Класс", "Ученик"]
+
+
+def _classroom(Number, Letter) -> str:
+    return f"{Number or ''}{Letter or ''}"
+
+
+async def _csv(header: list[str], rows) -> AsyncIterator[bytes]:
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";")
+
+    # Excel only detects UTF-8 with a BOM
+    buffer.write("\ufeff")
+    writer.writerow(header)
+
+    async for row in rows:
+        writer.writerow(row)
+
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue().encode()
+
+
+def schedule_csv() -> AsyncIterator[bytes]:
+    return _csv(
+        SCHEDULE_HEADER,
+        (
+            (
+                _classroom(Number, Letter),
+                utils.DAYS_OF_WEEK[day - 1],
+                order,
+                subject,
+            )
+            async for Number, Letter, day, order, subject in (
+                repository.iter_export_lessons()
+            )
+        ),
+    )
+
+
+def pupils_csv() -> AsyncIterator[bytes]:
+    return _csv(
+        PUPILS_HEADER,
+        (
+            (_classroom(Number, Letter), fullname)
+            async for Number, Letter, fullname in (
+                repository.iter_export_pupils()
+            )
+        ),
+    )
+
+
+async def school_json() -> AsyncIterator[bytes]:
+    """
+    A JSON array with one object per class:
+
+        {"class": "5А", "number": "5", "letter": "А",
+         "schedule": {"Понедельник": ["Математика", "", "Физика"], ...},
+         "pupils": ["Иванов Иван", ...]}
+
+    The lesson number is the position in the day's list, "" is a free
+    period.
+    """
+
+    buffer = io.StringIO()
+    buffer.write("[")
+    separator = "\n"
+
+    async for (
+        Number,
+        Letter,
+        lessons,
+        pupils,
+    ) in repository.iter_export_classrooms():
+        days = {}
+        for day, order, subject in lessons:
+            days.setdefault(day, []).append((order, subject))
+
+        # By position, "" for a free period, so lesson numbers survive
+        schedule = {
+            utils.DAYS_OF_WEEK[day - 1]: repository.names_by_order(day_lessons)
+            for day, day_lessons in days.items()
+        }
+
+        buffer.write(separator)
+        json.dump(
+            {
+                "class": _classroom(Number, Letter),
+                "number": Number,
+                "letter": Letter,
+                "schedule": schedule,
+                "pupils": pupils,
+            },
+            buffer,
+            ensure_ascii=False,
+        )
+        separator = ",\n"
+
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+
+    buffer.write("\n]\n")
+    yield buffer.getvalue().encode()
+
+
+EXPORTS = {
+    "schedule.csv": schedule_csv,
+    "pupils.csv": pupils_csv,
+    "school.json": school_json,
+}
+
+
+class ExportFile(InputFile):
+    """
+    Uploads an export while it is being generated.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(filename=name)
+        self.export = EXPORTS[name]
+
+    async def read(self, bot: Bot) -> AsyncIterator[bytes]:
+        async for chunk in self.export():
+            yield chunk
@@ -0,0 +1,251 @@
+import io
+import re
+import csv
+import codecs
+import zipfile
+from typing import IO, Iterator, NamedTuple, Union
+from xml.etree.ElementTree import ParseError, iterparse
+
+import utils
+
+# A school-wide schedule as a table, one lesson per row:
+#
+#   Класс;День;Урок;Предмет
+#   5А;Понедельник;1;Математика
+#
+# The header is optional. Days are names, short names or numbers 1-5.
+
+MAX_FILE_SIZE = 5 * 1024 * 1024
+MAX_ERRORS = 10
+MAX_SUBJECT_LENGTH = 50
+
+CLASSROOM = re.compile(r"^\s*(\d{1,2})\s*[-\s\"«]*([^\W\d_])[\"»]?\s*$")
+DAYS = {
+    **{name.lower(): day for day, name in enumerate(utils.DAYS_OF_WEEK, 1)},
+    **{
+        name: day for day, name in enumerate(["пн", "вт", "ср", "чт", "пт"], 1)
+    },
+    **{str(day): day for day in range(1, 6)},
+}
+
+_SPREADSHEET = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+
+class ImportRow(NamedTuple):
+    line: int
+    Number: str
+    Letter: str
+    day: int
+    order: int
+    subject: str
+
+
+class ScheduleImportError(ValueError):
+    def __init__(self, errors: list[str]):
+        super().__init__("\n".join(errors))
+        self.errors = errors
+
+
+def _csv_encoding(stream: IO[bytes]) -> str:
+    # Excel on a Russian Windows saves CSV in cp1251 rather than UTF-8
+
+    decoder = codecs.getincrementaldecoder("utf-8")()
+
+    try:
+        while chunk := stream.read(64 * 1024):
+            decoder.decode(chunk)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return "cp1251"
+    finally:
+        stream.seek(0)
+
+    return "utf-8-sig"
+
+
+def read_csv(stream: IO[bytes]) -> Iterator[list[str]]:
+
+    text = io.TextIOWrapper(
+        stream,
+        encoding=_csv_encoding(stream),
+        errors="replace",
+        newline="",
+    )
+    sample = text.read(4096)
+    text.seek(0)
+
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=";,\t")
+    except csv.Error:
+        dialect = csv.excel
+
+    yield from csv.reader(text, dialect)
+
+
+def _column(reference: str) -> int:
+    # "C12" -> 2
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - ord("A") + 1
+    return index - 1
+
+
+def read_xlsx(stream: IO[bytes]) -> Iterator[list[str]]:
+    """
+    Rows of the first sheet. Parsed with iterparse, so only the shared
+    strings and one row are in memory at a time.
+    """
+
+    with zipfile.ZipFile(stream) as archive:
+
+        shared = []
+        if "xl/sharedStrings.xml" in archive.namelist():
+            with archive.open("xl/sharedStrings.xml") as strings:
+                for _, element in iterparse(strings):
+                    if element.tag == f"{_SPREADSHEET}si":
+                        shared.append(
+                            "".join(
+                                node.text or ""
+                                for node in element.iter(f"{_SPREADSHEET}t")
+                            )
+                        )
+                        element.clear()
+
+        with archive.open("xl/worksheets/sheet1.xml") as sheet:
+            for _, element in iterparse(sheet):
+
+                if element.tag != f"{_SPREADSHEET}row":
+                    continue
+
+                row = []
+                for cell in element.iter(f"{_SPREADSHEET}c"):
+
+                    if (value := cell.find(f"{_SPREADSHEET}v")) is not None:
+                        value = value.text or ""
+                        if cell.get("t") == "s":
+                            value = shared[int(value)]
+                    else:
+                        value = "".join(
+                            node.text or ""
+                            for node in cell.iter(f"{_SPREADSHEET}t")
+                        )
+
+                    column = (
+                        _column(cell.get("r", ""))
+                        if cell.get("r")
+                        else len(row)
+                    )
+                    row.extend([""] * (column - len(row)))
+                    row.append(value)
+
+                element.clear()
+                yield row
+
+
+def read_rows(stream: IO[bytes], filename: str) -> Iterator[list[str]]:
+
+    if filename.lower().endswith(".xlsx"):
+        return read_xlsx(stream)
+
+    if filename.lower().endswith((".csv", ".txt")):
+        return read_csv(stream)
+
+    raise ScheduleImportError(["Поддерживаются только файлы .csv и .xlsx"])
+
+
+def _read(stream: IO[bytes], filename: str) -> Iterator[list[str]]:
+
+    try:
+        yield from read_rows(stream, filename)
+    # Not a zip, no first sheet, broken XML or shared strings
+    except (zipfile.BadZipFile, KeyError, IndexError, ParseError) as error:
+        raise ScheduleImportError(
+            [
+                "Не удалось прочитать файл: он повреждён или сохранён не в "
+                "формате Excel (.xlsx)"
+            ]
+        ) from error
+
+
+def _parse_row(line: int, cells: list[str]) -> Union[ImportRow, str]:
+
+    cells = [cell.strip() for cell in cells] + [""] * 4
+    classroom, day, order, subject = cells[:4]
+
+    if not (match := CLASSROOM.match(classroom)) or not (
+        1 <= int(match[1]) <= 11
+    ):
+        return f'Строка {line}: непонятный класс "{classroom}"'
+
+    if (day_number := DAYS.get(day.lower().rstrip("."))) is None or (
+        day_number > 5
+    ):
+        return f'Строка {line}: непонятный день "{day}"'
+
+    # Excel stores numbers as "1.0"
+    if not re.fullmatch(r"\d{1,2}(\.0+)?", order) or not (
+        1 <= (order_number := int(float(order))) <= 20
+    ):
+        return f'Строка {line}: номер урока должен быть от 1 до 20, а не "{order}"'
+
+    if not subject:
+        return f"Строка {line}: не указан предмет"
+
+    if len(subject) > MAX_SUBJECT_LENGTH:
+        return f"Строка {line}: название предмета длиннее {MAX_SUBJECT_LENGTH} символов"
+
+    # "05А" is class 5 like everywhere else, not a class "05"
+    return ImportRow(
+        line,
+        str(int(match[1])),
+        match[2].upper(),
+        day_number,
+        order_number,
+        subject,
+    )
+
+
+def parse(stream: IO[bytes], filename: str) -> list[ImportRow]:
+    """
+    Reads and validates the whole table before anything is written. Raises
+    ScheduleImportError with the first MAX_ERRORS problems.
+    """
+
+    rows = []
+    errors = []
+    seen = {}
+
+    for line, cells in enumerate(_read(stream, filename), start=1):
+
+        if not any(cell.strip() for cell in cells):
+            continue
+
+        result = _parse_row(line, cells)
+
+        if isinstance(result, str):
+            # A header is a first row that isn't a lesson
+            if line == 1 and not rows:
+                continue
+            errors.append(result)
+        elif (
+            key := (result.Number, result.Letter, result.day, result.order)
+        ) in seen:
+            errors.append(
+                f"Строка {line}: урок {result.order} уже указан в строке {seen[key]}"
+            )
+        else:
+            seen[key] = line
+            rows.append(result)
+
+        if len(errors) >= MAX_ERRORS:
+            break
+
+    if errors:
+        raise ScheduleImportError(errors)
+
+    if not rows:
+        raise ScheduleImportError(["В файле нет ни одного урока"])
+
+    return rows
@@ -0,0 +1,117 @@
+import copy
+import asyncio
+import logging
+from typing import Any, Dict, Mapping, Union
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import (
+    BaseStorage,
+    DefaultKeyBuilder,
+    StateType,
+    StorageKey,
+)
+
+import repository
+from cache import LRUCache, MISSING
+
+logger = logging.getLogger(__name__)
+
+# A single interaction often writes several times (handle_edit_schedule
+# alone calls update_data three times), all of them land in one flush
+FLUSH_DELAY = 0.2  # seconds
+
+
+class DjangoStorage(BaseStorage):
+    """
+    FSM storage kept in the FSMStates table, so flows in progress survive a
+    restart and can be shared between processes. Reads go through an
+    in-process cache, writes are buffered and flushed in one transaction.
+    """
+
+    def __init__(self, cache_size: int = 10_000):
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True)
+        self._cache = LRUCache(maxsize=cache_size)
+        # Written but not yet flushed, never evicted before the flush
+        self._dirty: Dict[str, tuple[Union[str, None], dict]] = {}
+        self._flush_task: Union[asyncio.Task, None] = None
+
+    async def _get(self, key: StorageKey) -> tuple[Union[str, None], dict]:
+
+        key = self.key_builder.build(key)
+
+        if (record := self._dirty.get(key)) is not None:
+            return record
+
+        return await self._cache.get_or_load(
+            key, lambda: repository.load_fsm_state(key)
+        )
+
+    async def _put(
+        self, key: StorageKey, state: Union[str, None], data: dict
+    ) -> None:
+
+        key = self.key_builder.build(key)
+
+        self._dirty[key] = (state, data)
+        # invalidate() also drops a load in flight, it must not win the race
+        self._cache.invalidate(key)
+        self._cache.set(key, (state, data))
+
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(FLUSH_DELAY)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+
+        if not self._dirty:
+            return
+
+        records, self._dirty = self._dirty, {}
+
+        try:
+            await repository.save_fsm_states(records)
+        except Exception:
+            logger.exception("Failed to save %s FSM states", len(records))
+            # Keep what was written meanwhile, retry the rest later
+            self._dirty = {**records, **self._dirty}
+            if self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def set_state(
+        self, key: StorageKey, state: StateType = None
+    ) -> None:
+        _, data = await self._get(key)
+        await self._put(
+            key, state.state if isinstance(state, State) else state, data
+        )
+
+    async def get_state(self, key: StorageKey) -> Union[str, None]:
+        state, _ = await self._get(key)
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+
+        state, _ = await self._get(key)
+        await self._put(key, state, copy.deepcopy(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._get(key)
+        return copy.deepcopy(data)
+
+    async def close(self) -> None:
+
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+
+        await self.flush()
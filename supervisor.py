@@ -0,0 +1,211 @@
+import time
+import asyncio
+import logging
+import multiprocessing
+from typing import Any, Awaitable, Callable, Union
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+import repository
+
+logger = logging.getLogger(__name__)
+
+# Workers are forked so they inherit the configured Dispatcher and Django
+ctx = multiprocessing.get_context("fork")
+
+
+def shard(update: Update, workers: int) -> int:
+    """
+    Every update of one user goes to the same worker, so that user's FSM
+    transitions are handled by one process and in order.
+    """
+
+    user = getattr(update.event, "from_user", None)
+    return (user.id if user else update.update_id) % workers
+
+
+def run_worker(
+    index: int,
+    inbox: multiprocessing.Queue,
+    events: multiprocessing.Queue,
+    dp: Dispatcher,
+    create_bot: Callable[[], Bot],
+    on_start: Callable[[Bot, int], Awaitable[Any]],
+):
+    """
+    Worker process: feeds the updates it is given to the dispatcher and
+    applies cache invalidations published by the other workers.
+    """
+
+    repository.publish_invalidation = lambda cache, key: events.put(
+        (index, cache, key)
+    )
+
+    async def work():
+        bot = create_bot()
+        await on_start(bot, index)
+        await dp.emit_startup(bot=bot)
+
+        loop = asyncio.get_running_loop()
+        tasks = set()
+
+        while (
+            message := await loop.run_in_executor(None, inbox.get)
+        ) is not None:
+
+            match message:
+                case ("update", update):
+                    task = asyncio.create_task(dp.feed_raw_update(bot, update))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                case ("invalidate", cache, key):
+                    repository.apply_invalidation(cache, key)
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await dp.emit_shutdown(bot=bot)
+        await bot.session.close()
+
+    # The database connections of the parent must not be shared
+    from django.db import connections
+
+    connections.close_all()
+
+    asyncio.run(work())
+
+
+class Supervisor:
+    """
+    Runs `workers` processes and routes updates to them by user id.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        dp: Dispatcher,
+        create_bot: Callable[[], Bot],
+        on_worker_start: Callable[[Bot, int], Awaitable[Any]],
+    ):
+        self.dp = dp
+        self.inboxes = [ctx.Queue() for _ in range(workers)]
+        self.events = ctx.Queue()
+        self.processes = [
+            ctx.Process(
+                target=run_worker,
+                args=(
+                    index,
+                    inbox,
+                    self.events,
+                    dp,
+                    create_bot,
+                    on_worker_start,
+                ),
+                name=f"bot-worker-{index}",
+            )
+            for index, inbox in enumerate(self.inboxes)
+        ]
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+
+    def route(self, update: Update):
+        self.inboxes[shard(update, len(self.inboxes))].put(
+            ("update", update.model_dump(mode="json", exclude_unset=True))
+        )
+
+    def stop(self, timeout: Union[float, None] = None):
+
+        for inbox in self.inboxes:
+            inbox.put(None)
+
+        for process in self.processes:
+            process.join(timeout)
+
+        self.events.put(None)
+
+    async def forward_events(self):
+        # Cache invalidations from one worker are replayed on all the others
+        loop = asyncio.get_running_loop()
+
+        while (
+            event := await loop.run_in_executor(None, self.events.get)
+        ) is not None:
+            sender, cache, key = event
+
+            for index, inbox in enumerate(self.inboxes):
+                if index != sender:
+                    inbox.put(("invalidate", cache, key))
+
+    async def watch_workers(self):
+
+        while True:
+            await asyncio.sleep(5)
+
+            if dead := [p.name for p in self.processes if not p.is_alive()]:
+                raise RuntimeError(f"Workers exited unexpectedly: {dead}")
+
+    async def poll(self, bot: Bot, polling_timeout: int = 30):
+        offset = None
+        allowed_updates = self.dp.resolve_used_update_types()
+
+        await bot.delete_webhook()
+
+        while True:
+            try:
+                updates = await bot.get_updates(
+                    offset=offset,
+                    timeout=polling_timeout,
+                    allowed_updates=allowed_updates,
+                )
+            except Exception:
+                logger.exception("Failed to fetch updates, retrying")
+                await asyncio.sleep(1)
+                continue
+
+            for update in updates:
+                self.route(update)
+                offset = update.update_id + 1
+
+    def create_webhook_app(
+        self, bot: Bot, path: str, secret: str
+    ) -> web.Application:
+
+        async def handle(request: web.Request) -> web.Response:
+
+            if (
+                request.headers.get("X-Telegram-Bot-Api-Secret-Token")
+                != secret
+            ):
+                return web.Response(status=401)
+
+            self.route(
+                Update.model_validate(
+                    await request.json(), context={"bot": bot}
+                )
+            )
+            return web.Response()
+
+        app = web.Application()
+        app.router.add_post(path, handle)
+
+        return app
+
+    async def run(self, receive: Awaitable[Any]):
+        """
+        Runs `receive` (polling or a webhook server) until it or a worker
+        fails, then shuts the workers down.
+        """
+
+        forwarder = asyncio.create_task(self.forward_events())
+
+        try:
+            await asyncio.gather(receive, self.watch_workers())
+        finally:
+            started = time.monotonic()
+            await asyncio.to_thread(self.stop, 30)
+            await forwarder
+            logger.info(
+                "Workers stopped in %.1f s", time.monotonic() - started
+            )
@@ -1,6 +1,10 @@
+import os
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import zip_longest
+from pathlib import Path
 from typing import Union
-from qrcode_styled import QRCodeStyled
-from PIL import Image
 from natasha import (
     Segmenter,
     MorphVocab,
@@ -22,7 +26,33 @@ from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
 from aiogram.filters.callback_data import CallbackData
 
 from Models import models
+from cache import LRUCache, MISSING
 import keyboards
+import qr
+
+DAYS_OF_WEEK = [
+    "Понедельник",
+    "Вторник",
+    "Среда",
+    "Четверг",
+    "Пятница",
+    "Суббота",
+    "Воскресенье",
+]
+
+# Rendered invite QR codes, ClassRoomIdentifier -> PNG bytes. The disk copy
+# survives restarts; the identifier never changes, so neither does the code.
+INVITE_QR_DIR = Path(
+    os.getenv("INVITE_QR_DIR", Path(__file__).resolve().parent / "qrcodes")
+)
+invite_qr_cache = LRUCache(maxsize=256)
+
+# Rendering is CPU-bound, so it runs in worker processes off the event loop
+QR_WORKERS = int(os.getenv("QR_WORKERS", 2))
+QR_QUEUE_SIZE = 16
+QR_TIMEOUT = 10  # seconds
+_qr_executor = None
+_qr_slots = None
 
 # segmenter = Segmenter()
 # morph_vocab = MorphVocab()
@@ -60,13 +90,16 @@ def extract_bare_fullname_from_text(text: str) -> Union[str, None]:
     return text
 
 
+# The keyboard builders below are memoized: arguments are hashable and the
+# markups are never mutated after they are built, so one instance is shared.
+
+
+@lru_cache(maxsize=256)
 def generate_classrooms(
-    ClassRooms: models.ClassRooms, purpose: str
+    class_numbers: tuple[str, ...], purpose: str
 ) -> Union[InlineKeyboardMarkup, None]:
 
-    class_numbers = list(
-        map(int, ClassRooms.values_list("Number", flat=True).distinct())
-    )
+    class_numbers = list(map(int, class_numbers))
     class_numbers.sort(reverse=True)
 
     if len(class_numbers) == 0:
@@ -88,28 +121,25 @@ def generate_classrooms(
     return builder.as_markup(resize_keyboard=True)
 
 
+@lru_cache(maxsize=1024)
 def generate_specific_classrooms(
-    ClassRooms: models.ClassRooms, class_number: int, purpose: str
+    classrooms: tuple[tuple[int, str], ...], class_number: int, purpose: str
 ) -> Union[InlineKeyboardMarkup, None]:
 
-    class_letters = list(
-        ClassRooms.values_list("Letter", flat=True).distinct()
-    )
-    class_letters.sort(reverse=True)
-
-    if len(class_letters) == 0:
+    if len(classrooms) == 0:
         return None
 
     builder = InlineKeyboardBuilder()
 
-    for class_letter in sorted(class_letters, key=lambda x: x.lower()):
+    for ClassRoom_id, class_letter in sorted(
+        classrooms, key=lambda classroom: classroom[1].lower()
+    ):
 
         builder.row(
             InlineKeyboardButton(
                 text=f'{class_number} "{class_letter}" класс',
                 callback_data=keyboards.ViewClassRoomCallback(
-                    class_number=class_number,
-                    class_letter=class_letter,
+                    classroom_id=ClassRoom_id,
                     purpose=purpose,
                 ).pack(),
             ),
@@ -119,7 +149,7 @@ def generate_specific_classrooms(
         InlineKeyboardButton(
             text=f"Назад",
             callback_data=keyboards.ViewClassRoomCallback(
-                class_number=0, class_letter="$", purpose=purpose, is_back=True
+                classroom_id=0, purpose=purpose, is_back=True
             ).pack(),
         ),
     )
@@ -127,30 +157,134 @@ def generate_specific_classrooms(
     return builder.as_markup(resize_keyboard=True)
 
 
-def generate_invite_qr(link):
+def _get_qr_executor() -> ProcessPoolExecutor:
+    global _qr_executor, _qr_slots
+
+    if _qr_executor is None:
+        _qr_executor = ProcessPoolExecutor(max_workers=QR_WORKERS)
+        _qr_slots = asyncio.Semaphore(QR_QUEUE_SIZE)
+
+    return _qr_executor
+
+
+async def render_invite_qr(link: str) -> bytes:
+    """
+    Renders a QR code in the worker pool. At most QR_QUEUE_SIZE renders are
+    queued or running; waiting for a slot counts towards QR_TIMEOUT, after
+    which asyncio.TimeoutError is raised.
+    """
+
+    executor = _get_qr_executor()
+    loop = asyncio.get_running_loop()
+
+    async def render():
+        await _qr_slots.acquire()
+
+        try:
+            future = loop.run_in_executor(executor, qr.render_invite_qr, link)
+        except BaseException:
+            _qr_slots.release()
+            raise
+
+        # A timeout can't stop the job in the worker, so the slot is held
+        # until the job is done, not until the caller gives up on it
+        future.add_done_callback(lambda _: _qr_slots.release())
+
+        return await asyncio.shield(future)
 
-    qr = QRCodeStyled()
-    image_buffer = qr.get_buffer(
-        data=link,
-        # image=Image.open("image.png"), # temp
-        _format="PNG",
+    return await asyncio.wait_for(render(), QR_TIMEOUT)
+
+
+def _write_invite_qr(path: Path, png: bytes):
+    INVITE_QR_DIR.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_suffix(".tmp")
+    temp_path.write_bytes(png)
+    temp_path.replace(path)
+
+
+async def generate_invite_qr(identifier: str, link: str) -> BufferedInputFile:
+
+    if (png := invite_qr_cache.get(identifier)) is MISSING:
+        path = INVITE_QR_DIR / f"{identifier}.png"
+
+        if await asyncio.to_thread(path.exists):
+            png = await asyncio.to_thread(path.read_bytes)
+        else:
+            png = await render_invite_qr(link)
+            await asyncio.to_thread(_write_invite_qr, path, png)
+
+        invite_qr_cache.set(identifier, png)
+
+    return BufferedInputFile(png, filename="qrcode.png")
+
+
+def generate_lessons_text(lesson_names: list[str]) -> str:
+    # Position is the lesson number, empty names are free periods
+    return "\n".join(
+        f"{order}. {lesson_name}"
+        for order, lesson_name in enumerate(lesson_names, start=1)
+        if lesson_name
+    )
+
+
+def generate_week_text(days: dict[int, list[str]]) -> str:
+    """
+    Lesson names by DayOfWeek, grouped under the day names in day order.
+    Days without lessons are left out.
+    """
+
+    return "\n\n".join(
+        f"*{DAYS_OF_WEEK[day - 1]}*\n{generate_lessons_text(lesson_names)}"
+        for day, lesson_names in sorted(days.items())
+        if any(lesson_names)
     )
-    image_buffer.seek(0)
 
-    return BufferedInputFile(image_buffer.getvalue(), filename="qrcode.png")
 
+def generate_schedule_diff(old: list[str], new: list[str]) -> str:
+    """
+    One line per lesson number whose subject changed, "3. Физика → Химия".
+    An added or removed lesson shows "—" on the empty side.
+    """
 
-def generate_classroom_information(ClassRoom: models.ClassRooms):
+    return "\n".join(
+        f"{order}. {before or '—'} → {after or '—'}"
+        for order, (before, after) in enumerate(
+            zip_longest(old, new, fillvalue=""), start=1
+        )
+        if before != after
+    )
 
-    pupils = ClassRoom.Pupils.all()
 
-    if len(pupils) == 0:
+def generate_schedule_change_text(
+    day: int, old: list[str], new: list[str]
+) -> Union[str, None]:
+    # Pupils get only what changed; a day set for the first time in full.
+    # None when there is nothing to tell them.
+    day_name = DAYS_OF_WEEK[day - 1]
+
+    if not any(old):
+        if not (lessons_text := generate_lessons_text(new)):
+            return None
+
+        return f"🚨 Появилось расписание на *{day_name}* 📢\n\n{lessons_text}"
+
+    if not (diff := generate_schedule_diff(old, new)):
+        return None
+
+    return f"🚨 У тебя обновилось расписание на *{day_name}* 📢\n\n{diff}"
+
+
+def generate_classroom_information(
+    ClassRoom: models.ClassRooms, pupil_names: list[str]
+):
+
+    if len(pupil_names) == 0:
         pupil_list = "Тут пока пусто..."
     else:
         pupil_list = "\n".join(
             [
-                f"{index + 1}. {pupil.Fullname}"
-                for index, pupil in enumerate(pupils)
+                f"{index + 1}. {pupil_name}"
+                for index, pupil_name in enumerate(pupil_names)
             ]
         )
 
@@ -166,8 +300,7 @@ def generate_classroom_keyboard(ClassRoom: models.ClassRooms):
         InlineKeyboardButton(
             text=f"Сгенерировать QR-код",
             callback_data=keyboards.ClassRoomActionCallback(
-                class_number=ClassRoom.Number,
-                class_letter=ClassRoom.Letter,
+                classroom_id=ClassRoom.pk,
                 action="generate_qr_code",
             ).pack(),
         ),
@@ -175,8 +308,7 @@ def generate_classroom_keyboard(ClassRoom: models.ClassRooms):
         InlineKeyboardButton(
             text=f"Редактировать",
             callback_data=keyboards.ClassRoomActionCallback(
-                class_number=ClassRoom.Number,
-                class_letter=ClassRoom.Letter,
+                classroom_id=ClassRoom.pk,
                 action="edit",
             ).pack(),
         ),
@@ -184,8 +316,7 @@ def generate_classroom_keyboard(ClassRoom: models.ClassRooms):
         InlineKeyboardButton(
             text=f"Удалить",
             callback_data=keyboards.ClassRoomActionCallback(
-                class_number=ClassRoom.Number,
-                class_letter=ClassRoom.Letter,
+                classroom_id=ClassRoom.pk,
                 action="delete",
             ).pack(),
         ),
@@ -193,8 +324,7 @@ def generate_classroom_keyboard(ClassRoom: models.ClassRooms):
         InlineKeyboardButton(
             text=f"Назад",
             callback_data=keyboards.ClassRoomActionCallback(
-                class_number=ClassRoom.Number,
-                class_letter=ClassRoom.Letter,
+                classroom_id=ClassRoom.pk,
                 action="back",
             ).pack(),
         ),
@@ -211,8 +341,7 @@ def generate_delete_keyboard(ClassRoom: models.ClassRooms):
         InlineKeyboardButton(
             text=f"Подтвердить удаление",
             callback_data=keyboards.ClassRoomActionCallback(
-                class_number=ClassRoom.Number,
-                class_letter=ClassRoom.Letter,
+                classroom_id=ClassRoom.pk,
                 action="сonfirm_delete",
             ).pack(),
         ),
@@ -220,8 +349,7 @@ def generate_delete_keyboard(ClassRoom: models.ClassRooms):
         InlineKeyboardButton(
             text=f"Отменить",
             callback_data=keyboards.ClassRoomActionCallback(
-                class_number=ClassRoom.Number,
-                class_letter=ClassRoom.Letter,
+                classroom_id=ClassRoom.pk,
                 action="cancel_delete",
             ).pack(),
         ),
@@ -230,7 +358,8 @@ def generate_delete_keyboard(ClassRoom: models.ClassRooms):
     return builder.as_markup(resize_keyboard=True)
 
 
-def generate_week_schedule_for_admin(ClassRoom: models.ClassRooms):
+@lru_cache(maxsize=4096)
+def generate_week_schedule_for_admin(ClassRoom_id: int):
 
     builder = InlineKeyboardBuilder()
 
@@ -241,19 +370,26 @@ def generate_week_schedule_for_admin(ClassRoom: models.ClassRooms):
             InlineKeyboardButton(
                 text=day_name,
                 callback_data=keyboards.ClassRoomScheduleForWeekAdminCallback(
-                    class_number=ClassRoom.Number,
-                    class_letter=ClassRoom.Letter,
+                    classroom_id=ClassRoom_id,
                     day=day,
                 ).pack(),
             )
         )
 
+    builder.row(
+        InlineKeyboardButton(
+            text="Вся неделя",
+            callback_data=keyboards.WeekScheduleCallback(
+                classroom_id=ClassRoom_id
+            ).pack(),
+        )
+    )
+
     builder.row(
         InlineKeyboardButton(
             text=f"Назад",
             callback_data=keyboards.ClassRoomScheduleForWeekAdminCallback(
-                class_number=ClassRoom.Number,
-                class_letter=ClassRoom.Letter,
+                classroom_id=ClassRoom_id,
                 is_back=True,
             ).pack(),
         ),
@@ -262,8 +398,27 @@ def generate_week_schedule_for_admin(ClassRoom: models.ClassRooms):
     return builder.as_markup(resize_keyboard=True)
 
 
+@lru_cache(maxsize=1024)
+def generate_back_to_week_schedule(ClassRoom_id: int):
+
+    builder = InlineKeyboardBuilder()
+
+    builder.row(
+        InlineKeyboardButton(
+            text="Назад",
+            callback_data=keyboards.EditScheduleCallback(
+                day=0,
+                classroom_id=ClassRoom_id,
+                is_back=True,
+            ).pack(),
+        )
+    )
+
+    return builder.as_markup(resize_keyboard=True)
+
+
 def generate_edit_classroom_schedule(
-    class_number: int, class_letter: str, day: int, button_text: str
+    ClassRoom_id: int, day: int, button_text: str
 ):
 
     builder = InlineKeyboardBuilder()
@@ -272,7 +427,7 @@ def generate_edit_classroom_schedule(
         InlineKeyboardButton(
             text=f"{button_text}",
             callback_data=keyboards.EditScheduleCallback(
-                class_number=class_number, class_letter=class_letter, day=day
+                classroom_id=ClassRoom_id, day=day
             ).pack(),
         )
     ).row(
@@ -280,8 +435,7 @@ def generate_edit_classroom_schedule(
             text="Назад",
             callback_data=keyboards.EditScheduleCallback(
                 day=0,
-                class_number=class_number,
-                class_letter=class_letter,
+                classroom_id=ClassRoom_id,
                 is_back=True,
             ).pack(),
         )